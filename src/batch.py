@@ -0,0 +1,274 @@
+import os
+import re
+import csv
+import sys
+import time
+import queue
+import argparse
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from src.im2meas import YeadonModel, athlete_views
+from src.utils.image_config import load_plate
+from src.utils.views import preprocess_views
+from src.utils.pose import configure_predictor_pool, get_predictor_pool
+from src.utils.segmentation import get_session, REMBG_MODEL
+from src.utils.checkpoints import STAGES
+
+# the images of an athlete are named NAME_front, NAME_side, NAME_tuck, NAME_r_tuck and NAME_pike (like the app does)
+ATHLETE_VIEWS = ("front", "pike", "r_tuck", "side", "tuck")  # in the order of the arguments of YeadonModel
+ATHLETE_IMAGE = re.compile(r"^(?P<name>.+?)_(?P<view>front|side|r_tuck|tuck|pike)(_.*)?\.(jpe?g|png)$", re.IGNORECASE)
+SUMMARY = "batch_summary.csv"
+PREFETCH = 2  # the number of athletes preprocessed ahead by the reader thread of the streaming pipeline
+
+
+def discover_athletes(root: str):
+    """Find the athletes in a folder (and its subfolders) from the names of their images.
+
+    Parameters
+    ----------
+    root : str
+        The folder of the images.
+
+    Returns
+    -------
+    dict
+        The paths of the images of each athlete by view, by (folder, name).
+    """
+    athletes = {}
+    for directory, _, files in os.walk(root):
+        for file in sorted(files):
+            match = ATHLETE_IMAGE.match(file)
+            if match:
+                athlete = athletes.setdefault((directory, match["name"]), {})
+                athlete.setdefault(match["view"].lower(), os.path.join(directory, file))
+    return dict(sorted(athletes.items()))
+
+
+def _init_worker(torch_threads: int, backend: str, rembg_model: str):
+    """
+    Load the pose network and the rembg session when the worker starts, every athlete it processes reuses them.
+    """
+    get_predictor_pool(size=1, torch_threads=torch_threads, backend=backend)
+    get_session(rembg_model)
+
+
+def _output_dir(root: str, directory: str):
+    """
+    Return the folder of the outputs of the athletes of a folder: its path relative to the root of the batch.
+    """
+    output_dir = os.path.relpath(directory, root)
+    return "" if output_dir == os.curdir else output_dir
+
+
+def stream_athletes(athletes: dict, options: dict, prefetch: int = PREFETCH):
+    """Yield the athletes with their preprocessed views: a reader thread decodes and segments the views of the
+    next athletes while the current one goes through the pose network and the measurements.
+
+    The queue between the reader and the pipeline is bounded, so at most prefetch athletes wait in memory (plus
+    the one the reader is preprocessing and the one being measured) however many athletes there are.
+
+    Parameters
+    ----------
+    athletes : dict
+        The paths of the images of each athlete by view, given by discover_athletes.
+    options : dict
+        The keyword arguments of YeadonModel.
+    prefetch : int
+        The maximum number of athletes preprocessed ahead.
+
+    Yields
+    ------
+    tuple
+        The folder and the name of the athlete, the paths of its images and the results of preprocess_views (None
+        if its views could not be preprocessed, YeadonModel then preprocesses them and reports the error).
+    """
+    ready = queue.Queue(max(prefetch, 1))
+    plate = None
+    if options.get("background_plate"):
+        plate = load_plate(options["background_plate"], options["calibration"], options["rotation"])
+
+    def read():
+        try:
+            for (directory, name), paths in athletes.items():
+                preprocessed = None
+                try:
+                    if all(view in paths for view in ATHLETE_VIEWS):
+                        views = athlete_views(
+                            *(paths[view] for view in ATHLETE_VIEWS),
+                            options["calibration"],
+                            options["rotation"],
+                            options["luminosity"],
+                            options.get("rembg_model", REMBG_MODEL),
+                            plate,
+                        )
+                        preprocessed = preprocess_views(views, 0, options.get("rembg_model", REMBG_MODEL))
+                except Exception:
+                    # YeadonModel preprocesses them again and the error is reported in the summary
+                    preprocessed = None
+                ready.put((directory, name, paths, preprocessed))
+        finally:
+            # the pipeline stops waiting for athletes even if the reader failed
+            ready.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+    while True:
+        athlete = ready.get()
+        if athlete is None:
+            return
+        yield athlete
+
+
+def run_athlete(name: str, paths: dict, options: dict, preprocessed: list = None, output_dir: str = ""):
+    """
+    Compute the model of an athlete (from its views preprocessed ahead if given), its outputs are written in
+    output_dir. Return its name (in output_dir), its status (ok or failed), the time it took and the error.
+    """
+    start = time.perf_counter()
+    label = os.path.join(output_dir, name)
+    missing = [view for view in ATHLETE_VIEWS if view not in paths]
+    if missing:
+        return label, "failed", 0.0, f"missing views: {', '.join(missing)}"
+    try:
+        YeadonModel(*(paths[view] for view in ATHLETE_VIEWS), **options, preprocessed=preprocessed, name=name, output_dir=output_dir)
+    except Exception as e:
+        traceback.print_exc()
+        return label, "failed", time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return label, "ok", time.perf_counter() - start, ""
+
+
+def run_batch(
+    root: str,
+    options: dict,
+    workers: int = None,
+    torch_threads: int = None,
+    backend: str = "torch",
+    summary: str = SUMMARY,
+    prefetch: int = PREFETCH,
+):
+    """Compute the models of every athlete of a folder in a process pool whose workers keep the pose network and the
+    rembg session loaded, then write the summary table. The athletes are streamed to the workers (see
+    stream_athletes): the views of the next athletes are preprocessed while the workers measure the previous ones.
+
+    Parameters
+    ----------
+    root : str
+        The folder of the images (see discover_athletes).
+    options : dict
+        The keyword arguments of YeadonModel (rotation, mass, calibration, distance, luminosity, ...).
+    workers : int
+        The number of processes (the number of CPUs if None, 0 or 1 to measure the athletes in this process).
+    torch_threads : int
+        The number of threads of the pose network of each worker (the CPUs shared between the workers if None).
+    backend : str
+        The backend running the pose network.
+    summary : str
+        The path to the summary table (csv).
+    prefetch : int
+        The number of athletes preprocessed ahead of the ones being measured.
+
+    Returns
+    -------
+    list of tuples
+        The name, the status, the time (s) and the error of each athlete.
+    """
+    athletes = discover_athletes(root)
+    workers = os.cpu_count() if workers is None else workers
+    if torch_threads is None:
+        torch_threads = max(1, os.cpu_count() // max(workers, 1))
+    rembg_model = options.get("rembg_model", REMBG_MODEL)
+    # the athletes are the parallel tasks, the views of an athlete are not preprocessed in another pool
+    options = {**options, "workers": 0}
+    start = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        print(f"{result[0]}: {result[1]} in {result[2]:.1f} s")
+
+    if workers <= 1:
+        configure_predictor_pool(torch_threads=torch_threads, backend=backend)
+        for directory, name, paths, preprocessed in stream_athletes(athletes, options, prefetch):
+            report(run_athlete(name, paths, options, preprocessed, _output_dir(root, directory)))
+            # the views of the athlete are released before the next one is taken from the queue
+            del preprocessed
+    else:
+        with ProcessPoolExecutor(
+            workers,
+            # spawn so the workers do not inherit the threads of torch
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(torch_threads, backend, rembg_model),
+        ) as executor:
+            futures = {}
+
+            def collect(done):
+                for future in done:
+                    try:
+                        report(future.result())
+                    except BrokenProcessPool as e:
+                        # a worker died (out of memory for example), the athletes it did not finish are failures
+                        report((futures[future], "failed", 0.0, f"{type(e).__name__}: {e}"))
+                    del futures[future]
+
+            for directory, name, paths, preprocessed in stream_athletes(athletes, options, prefetch):
+                # one athlete per worker is submitted, so the preprocessed views waiting in memory stay bounded
+                if len(futures) >= workers:
+                    collect(wait(futures, return_when=FIRST_COMPLETED)[0])
+                label = os.path.join(_output_dir(root, directory), name)
+                try:
+                    futures[executor.submit(run_athlete, name, paths, options, preprocessed, _output_dir(root, directory))] = label
+                except BrokenProcessPool as e:
+                    report((label, "failed", 0.0, f"{type(e).__name__}: {e}"))
+                del preprocessed
+            collect(as_completed(list(futures)))
+
+    with open(summary, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("name", "status", "seconds", "error"))
+        writer.writerows((name, status, f"{seconds:.2f}", error) for name, status, seconds, error in results)
+    succeeded = sum(status == "ok" for _, status, _, _ in results)
+    print(f"{succeeded}/{len(results)} athletes succeeded in {time.perf_counter() - start:.1f} s, see {summary}")
+    return results
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="im2meas.py batch", description="Im2meas on every athlete of a folder")
+
+    parser.add_argument("root", type=str, help="Path to the folder of the images (NAME_front, NAME_side, NAME_tuck, NAME_r_tuck and NAME_pike)")
+    parser.add_argument("--rotation", type=int, default=0, help="Enter 1 if you need to rotate the images (otherwise their EXIF orientation is used)")
+    parser.add_argument("-c", "--calibration", type=int, default=0, help="Enter 1 if you want to calibrate the images")
+    parser.add_argument("--distance", type=int, default=350, help="Enter the distance between the camera and the wall")
+    parser.add_argument("-l", "--luminosity", type=int, default=0, help="Enter 1 if you want to increase the luminosity of the images")
+    parser.add_argument("-e", "--edges", type=str, default="raster", choices=["raster", "contour"], help="Enter contour to measure on the contour polylines instead of the edges images")
+    parser.add_argument("--rembg_model", type=str, default=REMBG_MODEL, help="Enter the rembg model removing the background (u2net, u2netp, silueta, ...)")
+    parser.add_argument("--plate", type=str, default=None, help="Enter the path to a photo of the empty rig to remove the backgrounds by subtraction instead of rembg")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Enter the number of processes, each one computing an athlete (the number of CPUs by default)")
+    parser.add_argument("--torch_threads", type=int, default=None, help="Enter the number of threads of the pose network of each process (the CPUs shared between the processes by default)")
+    parser.add_argument("-p", "--pose", type=str, default="torch", choices=["torch", "onnx", "onnx-int8"], help="Enter the backend running the pose network")
+    parser.add_argument("--resume", action="store_true", help="Restart every athlete from the last stage saved by a previous run")
+    parser.add_argument("--until", type=str, default=None, choices=STAGES, help="Enter the last stage to compute (to debug the previous ones)")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH, help="Enter the number of athletes preprocessed ahead of the ones being measured")
+    parser.add_argument("-s", "--summary", type=str, default=SUMMARY, help="Enter the path to the summary table")
+
+    args = parser.parse_args(argv)
+    options = dict(
+        rotation=args.rotation,
+        mass=0,
+        calibration=args.calibration,
+        distance=args.distance,
+        luminosity=args.luminosity,
+        edges_backend=args.edges,
+        rembg_model=args.rembg_model,
+        background_plate=args.plate,
+        resume=args.resume,
+        until=args.until,
+    )
+    return run_batch(args.root, options, args.workers, args.torch_threads, args.pose, args.summary, args.prefetch)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
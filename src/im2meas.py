@@ -1,13 +1,62 @@
-import openpifpaf
+import os
+import sys
 import argparse
 
 from src.utils.find_body_parts import *
+from src.utils.edge_field import index_edges
 from src.utils.image_config import *
 from src.utils.perimeter_calculator import *
-from src.utils.generate_yml import generate_yml
-
-
-
+from src.utils.generate_yml import generate_yml, tech_opt_path
+from src.utils.pose import configure_predictor_pool, predict_keypoints, pose_backend
+from src.utils.segmentation import REMBG_MODEL
+from src.utils.views import preprocess_views, view_key, VIEW_WORKERS
+from src.utils.measurements import MeasurementGraph, YEADON_MEASUREMENTS, ACROBATIC_MARKERS, DRAWN_MEASUREMENTS
+from src.utils.checkpoints import STAGES, CHECKPOINTED, run_dir, run_signature, save_stage, load_stage
+from src.utils.cache import derived_key, load_arrays, store_arrays
+
+VIEWS = ("front", "side", "tuck", "r_tuck", "pike")
+# the thickness of the contours of the edges of each view (the pike has no edges)
+LINE_SIZES = {"front": 2, "side": 1, "tuck": 2, "r_tuck": 2, "pike": None}
+# the name of the ratios of each view (and of the second ones, with a 2)
+RATIO_NAMES = {"front": "ratio", "side": "ratio_r_side", "tuck": "ratio_tuck", "r_tuck": "ratio_r_tuck", "pike": "ratio_pike"}
+# the other views whose key points are used by the landmarks of a view
+VIEW_DEPENDENCIES = {"side": ("front",)}
+
+
+def _primitive_name(primitive: tuple):
+    """
+    Return the name of a primitive in the cache of its view (operation/start/end).
+    """
+    operation, _, start, end = primitive
+    return f"{operation}/{start}/{end}"
+
+
+def athlete_views(
+    impath_front: str,
+    impath_pike: str,
+    impath_r_tuck: str,
+    impath_side: str,
+    impath_tuck: str,
+    calibration: int,
+    rotation: int,
+    luminosity: int,
+    rembg_model: str = REMBG_MODEL,
+    plate=None,
+):
+    """
+    Return the keyword arguments of preprocess_view for the five views of an athlete, in the order of VIEWS.
+    """
+    # the views are independent until the measurements, they are preprocessed in the worker pool
+    paths = {"front": impath_front, "side": impath_side, "tuck": impath_tuck, "r_tuck": impath_r_tuck, "pike": impath_pike}
+    views = [
+        dict(im_path=paths[view], calibration=calibration, rotation=rotation, plate=plate)
+        for view in VIEWS
+    ]
+    views[0]["luminosity"] = luminosity
+    # the masks, key points and ratios of the images already processed with the same parameters are cached
+    for view in views:
+        view["cache_key"] = view_key(rembg_model=rembg_model, **view)
+    return views
 
 
 class YeadonModel:
@@ -29,7 +78,16 @@ class YeadonModel:
                  mass: float,
                  calibration: int,
                  distance: int,
-                 luminosity: int):
+                 luminosity: int,
+                 edges_backend: str = "raster",
+                 rembg_model: str = REMBG_MODEL,
+                 background_plate: str = None,
+                 workers: int = VIEW_WORKERS,
+                 resume: bool = False,
+                 until: str = None,
+                 preprocessed: list = None,
+                 name: str = None,
+                 output_dir: str = ""):
         """Creates a YeadonModel object from an image path.
 
         Parameters
@@ -42,64 +100,167 @@ class YeadonModel:
             The path to the tuck image to be processed.
         impath_r_tuck : str
             The path to the right tuck image to be processed.
+        edges_backend : str
+            "raster" to measure on the edges images, "contour" to measure on the contour polylines (sub-pixel)
+        rembg_model : str
+            The rembg model removing the background (u2net, u2netp, silueta, ...)
+        background_plate : str
+            The path to a photo of the empty rig, the backgrounds are then removed by subtracting it (rembg is used if it fails)
+        workers : int
+            The number of processes preprocessing the views (0 to preprocess them in this process)
+        resume : bool
+            True to restart from the last stage saved by a run of the same images with the same parameters
+        until : str
+            The last stage computed (one of STAGES, None to compute all of them)
+        preprocessed : list
+            The results of preprocess_views for the views given by athlete_views (when they were preprocessed ahead,
+            by the reader thread of a batch for example), None to preprocess them
+        name : str
+            The name of the person (the start of the name of the front image, up to the first _, if None)
+        output_dir : str
+            The folder of the outputs of the person (the current folder by default), its run folder is in the
+            same folder of RUN_DIR so the persons with the same name in different folders do not overwrite each other
         Returns
         -------
         YeadonModel
             The YeadonModel object with the key points of the image.
         """
-        # front
-        pil_im, image, im, original_img, min_ratio = create_resize_remove_im_front(impath_front, calibration, rotation, luminosity)
-        edges = thresh(im, image, 2)
+        name = name or impath_front.split('/')[-1].split('_')[0]
+        run_folder = run_dir(name, output_dir)
+        plate = load_plate(background_plate, calibration, rotation) if background_plate else None
+        views = athlete_views(impath_front, impath_pike, impath_r_tuck, impath_side, impath_tuck, calibration, rotation, luminosity, rembg_model, plate)
+        cache_keys = [view["cache_key"] for view in views]
+        # the landmarks and the primitives of a view only depend on its image (and on the images of its
+        # VIEW_DEPENDENCIES), so when a photo is taken again only its view is measured again; the same photo
+        # given for two views is measured for each of them
+        keys = dict(zip(VIEWS, cache_keys))
+        view_keys = {
+            view: derived_key(keys[view], *(keys[other] for other in VIEW_DEPENDENCIES.get(view, ())), view=view, pose=pose_backend(), distance=distance, edges_backend=edges_backend)
+            for view in VIEWS
+        }
 
-        # edges short was for the edges for the hip to the knee because the original detection had some difficulty to detect the black of the short
-        edges_short = thresh(im, image, 2)
-        predictor = openpifpaf.Predictor(checkpoint="shufflenetv2k30-wholebody")
-        predictions, gt_anns, image_meta = predictor.pil_image(pil_im)
+        # each stage saves its output in the run folder of the person, a resumed run loads the outputs of the
+        # stages that succeeded with the same parameters and computes the next ones
+        stages = {
+            "segment": lambda: self._segment(state, views, workers, rembg_model, preprocessed),
+            "pose": lambda: self._pose(state, cache_keys),
+            "scale": lambda: self._scale(state, distance, run_folder, name),
+            "landmarks": lambda: self._landmarks(state, edges_backend, view_keys),
+            "measurements": lambda: self._measurements(state, edges_backend, view_keys),
+            "outputs": lambda: self._outputs(state, name, mass, output_dir),
+        }
+        signature = run_signature(views=cache_keys, pose=pose_backend(), distance=distance, edges_backend=edges_backend, mass=mass)
+        state = {}
+        for stage in STAGES:
+            output = load_stage(run_folder, stage, signature) if resume and stage in CHECKPOINTED else None
+            if output is None:
+                # the next stages depend on this one, they are computed again too
+                resume = False
+                output = stages[stage]()
+                if stage in CHECKPOINTED:
+                    save_stage(run_folder, stage, signature, **output)
+            else:
+                print(f"The {stage} stage is resumed from {run_folder}")
+            state.update(output)
+            vars(self).update(output.get("scale", {}))
+            if stage == until:
+                break
+
+    def _segment(self, state: dict, views: list, workers: int, rembg_model: str, preprocessed: list = None):
+        """
+        Preprocess the views (background removal, rotation, calibration and chessboards ratios), unless they
+        were preprocessed ahead.
+        """
+        if preprocessed is None:
+            preprocessed = preprocess_views(views, workers, rembg_model)
+        results = dict(zip(VIEWS, preprocessed))
+        return {
+            # the images given to the pose network, before the contours are drawn on them
+            "images": {view: np.asarray(result[0]) for view, result in results.items()},
+            "foregrounds": {view: result[2] for view, result in results.items()},
+            "ratios": {view: np.array(result[3]) for view, result in results.items()},
+        }
+
+    def _pose(self, state: dict, cache_keys: list):
+        """
+        Find the key points of the views.
+        """
+        # the five views go through the pose network in batched forward passes (the ones not in the cache)
+        # the predictors are loaded once per process and shared by every YeadonModel
+        keypoints = predict_keypoints([Image.fromarray(state["images"][view]) for view in VIEWS], cache_keys)
+        return {"keypoints": dict(zip(VIEWS, keypoints))}
+
+    def _scale(self, state: dict, distance: int, run_folder: str, name: str):
+        """
+        Compute the ratios (cm per pixel) of the views from their chessboards ratios.
+        """
+        Image.fromarray(state["images"]["pike"]).save(os.path.join(run_folder, f"{name}_pike.jpg"))
+        scale = {}
+        for view, ratio_name in RATIO_NAMES.items():
+            scale[ratio_name], scale[f"{ratio_name}2"] = get_new_ratio(distance, distance - 50, 150, *state["ratios"][view])
+        scale["ratio_bottom"], scale["ratio_bottom2"] = scale["ratio2"], scale["ratio2"]
+        return {"scale": scale}
+
+    @staticmethod
+    def _edges(state: dict, view: str, edges_backend: str):
+        """
+        Return the indexed edges of a view (the front ones completed by better_edges), they are only built for the
+        views that are measured again (the first time they are needed) and the contours are drawn on a copy of the
+        image of the view.
+        """
+        edges, drawn = state.setdefault("edges", {}), state.setdefault("drawn", {})
+        if view not in edges:
+            drawn[view] = np.array(state["images"][view])
+            raw_edges = thresh(state["foregrounds"][view], drawn[view], LINE_SIZES[view], edges_backend)
+            if view == "front":
+                raw_edges = better_edges(raw_edges, state["keypoints"]["front"][:, 0:2])
+            edges[view] = index_edges(raw_edges)
+        return edges[view]
+
+    def _landmarks(self, state: dict, edges_backend: str, view_keys: dict):
+        """
+        Find the landmarks of each view from its key points and its edges, the ones of the views that did not
+        change since a previous run are taken from the cache.
+        """
         # You can find the index here:
         # https://github.com/jin-s13/COCO-WholeBody/blob/master/imgs/Fig2_anno.png
-        # as "predictions" is an array the index starts at 0 and not at 1 like in the github
-        data = predictions[0].data[:, 0:2]
-        edges = better_edges(edges, data)
-        edges_short = better_edges(edges_short, data)
-
-        self.ratio, self.ratio2 = get_ratio(original_img, min_ratio)
-        self.ratio, self.ratio2 = get_new_ratio(distance, distance - 50, 150, self.ratio, self.ratio2)
-        self.ratio_bottom, self.ratio_bottom2 = self.ratio2, self.ratio2
-        # right side
-        pil_r_side_im, image_r_side, im_r_side, original_img_side, min_ratio = create_resize_remove_im(impath_side, calibration, rotation)
-
-        edges_r_side = thresh(im_r_side, image_r_side, 1)
-        predictions2, gt_anns2, image_meta2 = predictor.pil_image(pil_r_side_im)
-        data_r_side = predictions2[0].data[:, 0:2]
-
-        self.ratio_r_side, self.ratio_r_side2 = get_ratio(original_img_side, min_ratio)
-        self.ratio_r_side, self.ratio_r_side2 = get_new_ratio(distance, distance - 50, 150, self.ratio_r_side, self.ratio_r_side2)
-        # front tuck
-        pil_tuck_im, image_tuck, im_tuck, original_img_tuck, min_ratio = create_resize_remove_im(impath_tuck, calibration, rotation)
-
-        edges_tuck = thresh(im_tuck, image_tuck, 2)
-        predictions5, gt_anns5, image_meta5 = predictor.pil_image(pil_tuck_im)
-        data_tuck = predictions5[0].data[:, 0:2]
-        self.ratio_tuck, self.ratio_tuck2 = get_ratio(original_img_tuck, min_ratio)
-        self.ratio_tuck, self.ratio_tuck2 = get_new_ratio(distance, distance - 50, 150, self.ratio_tuck, self.ratio_tuck2)
-
-        # right side tuck
-        pil_l_tuck_im, image_r_tuck, im_l_tuck, original_img_l_tuck, min_ratio = create_resize_remove_im(impath_r_tuck, calibration, rotation)
-
-        edges_l_tuck = thresh(im_l_tuck, image_r_tuck, 2)
-        predictions6, gt_anns6, image_meta6 = predictor.pil_image(pil_l_tuck_im)
-        data_l_tuck = predictions6[0].data[:, 0:2]
-        self.ratio_r_tuck, self.ratio_r_tuck2 = get_ratio(original_img_l_tuck, min_ratio)
-        self.ratio_r_tuck, self.ratio_r_tuck2 = get_new_ratio(distance, distance - 50, 150, self.ratio_r_tuck, self.ratio_r_tuck2)
-        # pike
-        pil_pike_im, image_pike, im_pike, original_img_pike, min_ratio = create_resize_remove_im(impath_pike, calibration, rotation)
-        img = Image.fromarray(image_pike)
-        img.save("t.jpg")
-        predictions3, gt_anns3, image_meta3 = predictor.pil_image(pil_pike_im)
-        data_pike = predictions3[0].data[:, 0:2]
-        self.ratio_pike, self.ratio_pike2 = get_ratio(original_img_pike, min_ratio)
-        self.ratio_pike, self.ratio_pike2 = get_new_ratio(distance, distance - 50, 150, self.ratio_pike, self.ratio_pike2)
-        # front
+        # as "keypoints" is an array the index starts at 0 and not at 1 like in the github
+        data = {view: keypoints[:, 0:2] for view, keypoints in state["keypoints"].items()}
+        landmarks = {}
+        for view in VIEWS:
+            cached = load_arrays(view_keys[view], ("landmark_names", "landmarks", "landmark_integers"))
+            if cached is not None:
+                landmarks[view] = {
+                    name: value.astype(int) if integer else value
+                    for name, value, integer in zip(cached["landmark_names"], np.array(cached["landmarks"]), cached["landmark_integers"])
+                }
+                continue
+            if view == "front":
+                landmarks[view] = self._front_landmarks(data["front"], self._edges(state, "front", edges_backend))
+            elif view == "side":
+                landmarks[view] = self._side_landmarks(data["side"], self._edges(state, "side", edges_backend), data["front"])
+            elif view == "tuck":
+                landmarks[view] = self._tuck_landmarks(data["tuck"], self._edges(state, "tuck", edges_backend))
+            elif view == "r_tuck":
+                landmarks[view] = self._r_tuck_landmarks(data["r_tuck"], self._edges(state, "r_tuck", edges_backend))
+            else:
+                landmarks[view] = self._pike_landmarks(data["pike"])
+            values = [np.asarray(value) for value in landmarks[view].values()]
+            store_arrays(
+                view_keys[view],
+                landmark_names=np.array(list(landmarks[view])),
+                landmarks=np.array(values, dtype=float),
+                landmark_integers=np.array([np.issubdtype(value.dtype, np.integer) for value in values]),
+            )
+        return {"landmarks": landmarks}
+
+    def _front_landmarks(self, data: np.ndarray, edges):
+        """
+        Find the landmarks of the front view.
+        """
+        # edges short was for the edges for the hip to the knee because the original detection had some difficulty to detect the black of the short
+        # it is now computed exactly like edges, so the same map is shared
+        edges_short = edges
         body_parts_index = {
             "nose": 0,
             "nose_height": 74,
@@ -131,70 +292,6 @@ class YeadonModel:
             "right_toe_nail": 20,
         }
         bdy_part = {k: data[v] for k, v in body_parts_index.items()}
-        # right side
-        body_parts_index_r = {
-            "nose": 0,
-            "right_eye": 60,
-            "right_ear": 23,
-            "nose_up": 72,
-            "below_ear": 27,
-            "right_shoulder": 6,
-            "right_elbow": 8,
-            "right_wrist": 10,
-            "right_hip": 12,
-            "right_knee": 14,
-            "right_ankle": 16,
-        }
-
-        bdy_part_r_side = {k: data_r_side[v] for k, v in body_parts_index_r.items()}
-        # front tuck
-        body_parts_index_tuck = {
-            "left_shoulder": 5,
-            "left_wrist": 9,
-            "right_wrist": 10,
-            "left_elbow": 7,
-            "right_elbow": 8,
-            "left_hip": 11,
-            "right_hip": 12,
-            "left_knee": 13,
-            "right_knee": 14,
-            "left_ankle": 15,
-            "right_ankle": 16,
-            "left_heel": 19,
-            "right_heel": 22,
-            "left_toe_nail": 17,
-            "right_toe_nail": 20,
-        }
-        bdy_part_tuck = {k: data_tuck[v] for k, v in body_parts_index_tuck.items()}
-        # left side tuck
-        body_parts_index_r_tuck = {
-            "right_ear": 4,
-            "right_knuckle": 117,
-            "right_shoulder": 6,
-            "right_elbow": 8,
-            "right_hip": 12,
-            "right_knee": 14,
-            "right_ankle": 16,
-            "right_heel": 22,
-            "right_toe_nail": 20,
-        }
-        bdy_part_r_tuck = {k: data_l_tuck[v] for k, v in body_parts_index_r_tuck.items()}
-        # pike
-        body_parts_index_pike = {
-            "right_knee": 14,
-            "right_wrist": 10,
-            "right_knuckle": 125,
-            "right_shoulder": 6,
-            "right_elbow": 8,
-
-        }
-        bdy_part_pike = {k: data_pike[v] for k, v in body_parts_index_pike.items()}
-        #bdy_part_pike["right_mid_arm"] = (data_pike[6] + data_pike[8]) / 2
-        if bdy_part_pike["right_knuckle"][0] < 0:
-            bdy_part_pike["right_knuckle"] = bdy_part_pike["right_wrist"]
-        bdy_part_pike["right_hand"] = (bdy_part_pike["right_wrist"] + bdy_part_pike["right_knuckle"]) / 2
-
-        # front
         bdy_part["left_nails"] = (data[102] + data[103]) / 2
         bdy_part["right_nails"] = data[123]#(data[123] + data[124]) / 2
         left_lowest_front_rib_approx = (data[5] + data[11] * 1.1) / 2.1
@@ -231,15 +328,8 @@ class YeadonModel:
         bdy_part["left_maximum_calf"] = (data[13] + data[15]) / 2
         bdy_part["right_crotch"], bdy_part["left_crotch"] = get_crotch_right_left(edges_short, data)
         bdy_part["right_mid_thigh"], bdy_part["left_mid_thigh"] = get_mid_thigh_right_left(data, bdy_part["right_crotch"], bdy_part["left_crotch"])
-        bdy_part["left_wrist_width"] = max_perp(bdy_part["left_wrist"], bdy_part["left_elbow"], edges, image)
-        bdy_part["right_wrist_width"] = max_perp(bdy_part["right_wrist"], bdy_part["right_elbow"], edges, image)
-        bdy_part["left_nails_width"] = max_perp(bdy_part["left_nails"], bdy_part["left_wrist"], edges, image)
-        bdy_part["right_nails_width"] = max_perp(bdy_part["right_nails"], bdy_part["right_wrist"], edges, image)
-        bdy_part["left_knuckles_width"] = max_perp(bdy_part["left_knuckles"], bdy_part["left_wrist"], edges, image)
-        bdy_part["right_knuckles_width"] = max_perp(bdy_part["right_knuckles"], bdy_part["right_wrist"], edges, image)
-        bdy_part["crotch_width"] = min(
-            max_perp(bdy_part["left_crotch"], bdy_part["left_knee"], edges_short, image) * self.ratio_bottom,
-            max_perp(bdy_part["right_crotch"], bdy_part["right_knee"], edges_short, image) * self.ratio_bottom)
+        bdy_part["left_base_of_thumb_next"] = bdy_part["left_base_of_thumb"] + np.array([1, 0])
+        bdy_part["right_base_of_thumb_next"] = bdy_part["right_base_of_thumb"] + np.array([1, 0])
         bdy_part["hip"] = (bdy_part["right_hip"] + bdy_part["left_hip"]) / 2
         bdy_part["umbiculus"] = (bdy_part["right_umbiculus"] + bdy_part["left_umbiculus"]) / 2
         bdy_part["lowest_front_rib"] = (bdy_part["right_lowest_front_rib"] + bdy_part["left_lowest_front_rib"]) / 2
@@ -247,7 +337,27 @@ class YeadonModel:
         bdy_part["shoulder"] = (bdy_part["right_shoulder"] + bdy_part["left_shoulder"]) / 2
         bdy_part["acromion"] = (bdy_part["left_acromion_height"] + bdy_part["right_acromion_height"]) / 2
         bdy_part["ear"] = (bdy_part["right_ear"] + bdy_part["left_ear"]) / 2
-        # right side
+        return bdy_part
+
+    def _side_landmarks(self, data_r_side: np.ndarray, edges_r_side, data: np.ndarray):
+        """
+        Find the landmarks of the right side view (the nose is taken from the front key points when they are found).
+        """
+        body_parts_index_r = {
+            "nose": 0,
+            "right_eye": 60,
+            "right_ear": 23,
+            "nose_up": 72,
+            "below_ear": 27,
+            "right_shoulder": 6,
+            "right_elbow": 8,
+            "right_wrist": 10,
+            "right_hip": 12,
+            "right_knee": 14,
+            "right_ankle": 16,
+        }
+
+        bdy_part_r_side = {k: data_r_side[v] for k, v in body_parts_index_r.items()}
         if data[56][0] > 0 and data[74][0] > 0:
             bdy_part_r_side["nose"] = (data[56] + data[74]) / 2
         right_lowest_front_rib_approx = np.array([data_r_side[12][0], (data_r_side[6][1] + data_r_side[12][1] * 1.1) / 2.1])
@@ -256,182 +366,142 @@ class YeadonModel:
         bdy_part_r_side["right_umbiculus"] = (right_lowest_front_rib_approx + data_r_side[12]) / 2
         #bdy_part_r_side["right_maximum_calf"] = get_max_pt(data_r_side[14] + np.array([0, 5]), data_r_side[16], edges_r_side)
         bdy_part_r_side["right_nipple_pit"] = get_side_nipple(bdy_part_r_side["right_nipple"], edges_r_side)
-        # front tuck
+        bdy_part_r_side["right_nipple_pit_2"] = bdy_part_r_side["right_nipple_pit"] + np.array([-2, 0])
+        bdy_part_r_side["right_nipple_pit_5"] = bdy_part_r_side["right_nipple_pit"] + np.array([-5, 0])
+        return bdy_part_r_side
+
+    def _tuck_landmarks(self, data_tuck: np.ndarray, edges_tuck):
+        """
+        Find the landmarks of the front tuck view.
+        """
+        body_parts_index_tuck = {
+            "left_shoulder": 5,
+            "left_wrist": 9,
+            "right_wrist": 10,
+            "left_elbow": 7,
+            "right_elbow": 8,
+            "left_hip": 11,
+            "right_hip": 12,
+            "left_knee": 13,
+            "right_knee": 14,
+            "left_ankle": 15,
+            "right_ankle": 16,
+            "left_heel": 19,
+            "right_heel": 22,
+            "left_toe_nail": 17,
+            "right_toe_nail": 20,
+        }
+        bdy_part_tuck = {k: data_tuck[v] for k, v in body_parts_index_tuck.items()}
         point, dist = get_maximum_pit(data_tuck[16], edges_tuck)
         bdy_part_tuck["right_toe_nail"] = np.array([point[0], point[1] - 2 / self.ratio_tuck])
         bdy_part_tuck["right_ball"] = np.array(get_max_pt(data_tuck[16], bdy_part_tuck["right_toe_nail"], edges_tuck))
         bdy_part_tuck["right_arch"] = (data_tuck[16] + bdy_part_tuck["right_ball"]) / 2
-        bdy_part_tuck["left_wrist_width"] = max_perp(bdy_part_tuck["left_wrist"], bdy_part_tuck["left_elbow"], edges_tuck, image_tuck)
         bdy_part_tuck["left_mid_arm"] = (bdy_part_tuck["left_shoulder"] + bdy_part_tuck["left_elbow"]) / 2
         #print(circle_p(max_perp(bdy_part_tuck["left_mid_arm"], bdy_part_tuck["left_elbow"], edges_tuck, image_tuck) * self.ratio_tuck))
         if np.linalg.norm(bdy_part_tuck["right_ankle"] - bdy_part_tuck["right_arch"]) * self.ratio_tuck < 6:
             bdy_part_tuck["right_arch"] = (bdy_part_tuck["right_ankle"] + bdy_part_tuck["right_toe_nail"]) / 2
         if np.linalg.norm(bdy_part_tuck["right_ankle"] - bdy_part_tuck["right_ball"]) * self.ratio_tuck < 10:
             bdy_part_tuck["right_ball"] = (bdy_part_tuck["right_ankle"] + bdy_part_tuck["right_toe_nail"] * 2) / 3
-        # left side tuck
+        return bdy_part_tuck
+
+    def _r_tuck_landmarks(self, data_l_tuck: np.ndarray, edges_l_tuck):
+        """
+        Find the landmarks of the right tuck view.
+        """
+        body_parts_index_r_tuck = {
+            "right_ear": 4,
+            "right_knuckle": 117,
+            "right_shoulder": 6,
+            "right_elbow": 8,
+            "right_hip": 12,
+            "right_knee": 14,
+            "right_ankle": 16,
+            "right_heel": 22,
+            "right_toe_nail": 20,
+        }
+        bdy_part_r_tuck = {k: data_l_tuck[v] for k, v in body_parts_index_r_tuck.items()}
         bdy_part_r_tuck["right_toe_nail"], dist = get_maximum_pit(data_l_tuck[16], edges_l_tuck)
         bdy_part_r_tuck["right_heel"] = get_max_pt(data_l_tuck[16], bdy_part_r_tuck["right_toe_nail"], edges_l_tuck)
         bdy_part_r_tuck["right_ball"] = np.array(
             [bdy_part_r_tuck["right_toe_nail"][0], bdy_part_r_tuck["right_toe_nail"][1] - 2 / self.ratio_r_tuck])
         bdy_part_r_tuck["right_arch"] = (bdy_part_r_tuck["right_heel"] + bdy_part_r_tuck["right_ball"]) / 2
+        bdy_part_r_tuck["right_knee_at_knuckle"] = np.array([bdy_part_r_tuck["right_knee"][0], bdy_part_r_tuck["right_knuckle"][1]])
+        return bdy_part_r_tuck
+
+    def _pike_landmarks(self, data_pike: np.ndarray):
+        """
+        Find the landmarks of the pike view.
+        """
+        body_parts_index_pike = {
+            "right_knee": 14,
+            "right_wrist": 10,
+            "right_knuckle": 125,
+            "right_shoulder": 6,
+            "right_elbow": 8,
+
+        }
+        bdy_part_pike = {k: data_pike[v] for k, v in body_parts_index_pike.items()}
+        #bdy_part_pike["right_mid_arm"] = (data_pike[6] + data_pike[8]) / 2
+        if bdy_part_pike["right_knuckle"][0] < 0:
+            bdy_part_pike["right_knuckle"] = bdy_part_pike["right_wrist"]
+        bdy_part_pike["right_hand"] = (bdy_part_pike["right_wrist"] + bdy_part_pike["right_knuckle"]) / 2
+        return bdy_part_pike
 
-        self.keypoints = {
-            "Ls1L": get_length(bdy_part["umbiculus"], bdy_part["hip"], image) * self.ratio2,
-            "Ls2L": get_length(bdy_part["lowest_front_rib"], bdy_part["hip"], image) * self.ratio2,
-            "Ls3L": get_length(bdy_part["nipple"], bdy_part["hip"], image) * self.ratio2,
-            "Ls4L": get_length(bdy_part["shoulder"], bdy_part["hip"], image) * self.ratio2,
-            "Ls5L": get_length(bdy_part["acromion"], bdy_part["hip"], image) * self.ratio2,
-            "Ls6L": get_length(bdy_part["acromion"], bdy_part["nose_height"], image) * self.ratio2,
-            "Ls7L": get_length(bdy_part["acromion"], bdy_part["ear"], image) * self.ratio2,
-            "Ls8L": abs(bdy_part["left_acromion_height"][1] - bdy_part["top_of_head"][1]) * self.ratio2,
-
-            "Ls0p": stad_p(max_line(bdy_part["right_hip"], bdy_part["left_hip"], edges_short, image) * self.ratio,
-                           max_perp(bdy_part_r_side["right_hip"], bdy_part_r_side["right_knee"], edges_r_side, image_r_side) * self.ratio_r_side),
-            "Ls1p": stad_p(max_line(bdy_part["left_umbiculus"], bdy_part["right_umbiculus"], edges, image) * self.ratio,
-                           max_perp(bdy_part_r_side["right_umbiculus"], bdy_part_r_side["right_knee"], edges_r_side, image_r_side) * self.ratio_r_side),
-            "Ls2p": stad_p(
-                max(max_line(bdy_part["right_lowest_front_rib"], bdy_part["left_lowest_front_rib"], edges, image), np.linalg.norm(bdy_part["right_lowest_front_rib"] - bdy_part["left_lowest_front_rib"])) * self.ratio,
-                max_perp(bdy_part_r_side["right_lowest_front_rib"], bdy_part_r_side["right_hip"], edges_r_side, image_r_side) * self.ratio_r_side
-            ),
-            "Ls3p": stad_p(max_line(bdy_part["right_nipple"], bdy_part["left_nipple"], edges, image) * self.ratio,
-                           max_line(bdy_part_r_side["right_nipple_pit"] + np.array([-2, 0]), bdy_part_r_side["right_nipple_pit"] + np.array([-5, 0]), edges_r_side, image_r_side) * self.ratio_r_side),
-            "Ls5p": circle_p(get_length(bdy_part["left_acromion"], bdy_part["right_acromion"], image) * self.ratio),
-            "Ls6p": stad_p(get_length(bdy_part["nose_right"], bdy_part["nose_left"], image) * self.ratio, max_line(bdy_part_r_side["nose_up"], bdy_part_r_side["below_ear"], edges_r_side, image_r_side) * self.ratio_r_side),
-            "Ls7p": stad_p(get_length(bdy_part["left_ear"], bdy_part["right_ear"], image) * self.ratio,
-                           max_line(bdy_part_r_side["right_ear"], bdy_part_r_side["right_eye"], edges_r_side, image_r_side) * self.ratio_r_side),
-
-            "Ls0w": max_line(bdy_part["left_hip"], bdy_part["right_hip"], edges_short, image) * self.ratio,
-            "Ls1w": max(max_line(bdy_part["left_umbiculus"], bdy_part["right_umbiculus"], edges, image) * self.ratio,
-                        np.linalg.norm(bdy_part["left_umbiculus"] - bdy_part["right_umbiculus"]) * self.ratio),
-            "Ls2w": max(max_line(bdy_part["left_lowest_front_rib"], bdy_part["right_lowest_front_rib"], edges, image) * self.ratio,
-                        np.linalg.norm(bdy_part["left_lowest_front_rib"] - bdy_part["right_lowest_front_rib"]) * self.ratio),
-            "Ls3w": max(max_line(bdy_part["left_nipple"], bdy_part["right_nipple"], edges, image) * self.ratio,
-                        np.linalg.norm(bdy_part["left_nipple"] - bdy_part["right_nipple"]) * self.ratio),
-            "Ls4w": get_length(bdy_part["left_shoulder"], bdy_part["right_shoulder"], image) * self.ratio,
-
-            "Ls4d": max_perp(bdy_part_r_side["right_shoulder"], bdy_part_r_side["right_elbow"], edges_r_side, image_r_side) * self.ratio_r_side,
-
-            # Not needed"La1L": (np.linalg.norm(body_parts_pos["left_shoulder"] - body_parts_pos["left_elbow"])) / 2,
-            "La2L": get_length(bdy_part["left_shoulder"], bdy_part["left_elbow"], image) * self.ratio,
-            "La3L": get_length(bdy_part["left_shoulder"], bdy_part["left_maximum_forearm"], image) * self.ratio,
-            "La4L": get_length(bdy_part["left_shoulder"], bdy_part["left_wrist"], image) * self.ratio,
-            "La5L": get_length(bdy_part["left_wrist"], bdy_part["left_base_of_thumb"], image) * self.ratio,
-            "La6L": get_length(bdy_part["left_wrist"], bdy_part["left_knuckles"], image) * self.ratio,
-            "La7L": get_length(bdy_part["left_wrist"], bdy_part["left_nails"], image) * self.ratio,
-
-            "La0p": circle_p(max_perp(bdy_part["left_shoulder_perimeter_width"], bdy_part["left_shoulder"], edges,
-                                      image)) * self.ratio2,
-            "La1p": circle_p(min(max_perp(bdy_part_tuck["left_mid_arm"], bdy_part_tuck["left_elbow"], edges_tuck, image_tuck) * self.ratio_tuck,
-                                 max_perp(bdy_part["left_mid_arm"], bdy_part["left_elbow"], edges, image) * self.ratio)),
-            "La2p": circle_p(max_perp(bdy_part["left_elbow"], bdy_part["left_mid_arm"], edges, image)) * self.ratio2,
-            "La3p": circle_p(max_perp(bdy_part["left_maximum_forearm"], bdy_part["left_elbow"], edges, image)) * self.ratio2,
-            "La4p": stad_p(bdy_part["left_wrist_width"], bdy_part["left_wrist_width"] / 2) * self.ratio2,
-            #"La4p": stad_p(bdy_part["left_wrist_width"] * self.ratio2, bdy_part_tuck["left_wrist_width"] * self.ratio_tuck) ,
-            "La5p": stad_p(max_perp(bdy_part["left_base_of_thumb"], bdy_part["left_base_of_thumb"] + np.array([1, 0]), edges, image) * self.ratio2, 0),
-            "La6p": stad_p(bdy_part["left_knuckles_width"], bdy_part["left_knuckles_width"] / 3) * self.ratio2,
-            "La7p": stad_p(bdy_part["left_nails_width"], bdy_part["left_nails_width"] / 3) * self.ratio2,
-
-            "La4w": bdy_part["left_wrist_width"] * self.ratio2,
-            "La5w": max_perp(bdy_part["left_base_of_thumb"], bdy_part["left_base_of_thumb"] + np.array([1, 0]), edges, image) * self.ratio2,
-            "La6w": max_perp(bdy_part["left_knuckles"], bdy_part["left_wrist"], edges, image) * self.ratio2,
-            "La7w": max_perp(bdy_part["left_nails"], bdy_part["left_wrist"], edges, image) * self.ratio2,
-
-            # Not needed"Lb1L": (np.linalg.norm(body_parts_pos["right_shoulder"] - body_parts_pos["right_elbow"])) / 2,
-            "Lb2L": get_length(bdy_part["right_shoulder"], bdy_part["right_elbow"], image) * self.ratio,
-            "Lb3L": get_length(bdy_part["right_shoulder"], bdy_part["right_maximum_forearm"], image) * self.ratio,
-            "Lb4L": get_length(bdy_part["right_shoulder"], bdy_part["right_wrist"], image) * self.ratio,
-            "Lb5L": get_length(bdy_part["right_wrist"], bdy_part["right_base_of_thumb"], image) * self.ratio,
-            "Lb6L": get_length(bdy_part["right_wrist"], bdy_part["right_knuckles"], image) * self.ratio,
-            "Lb7L": get_length(bdy_part["right_wrist"], bdy_part["right_nails"], image) * self.ratio,
-
-            "Lb0p": circle_p(max_perp(bdy_part["right_shoulder_perimeter_width"], bdy_part["right_shoulder"], edges, image)) * self.ratio2,
-            "Lb1p": circle_p(min(max_perp(bdy_part_tuck["left_mid_arm"], bdy_part_tuck["left_elbow"], edges_tuck, image_tuck) * self.ratio_tuck,
-                             max_perp(bdy_part["right_mid_arm"], bdy_part["right_elbow"], edges, image) * self.ratio)),
-            "Lb2p": circle_p(max_perp(bdy_part["right_elbow"], bdy_part["right_mid_arm"], edges, image)) * self.ratio2,
-            "Lb3p": circle_p(max_perp(bdy_part["right_maximum_forearm"], bdy_part["right_elbow"], edges, image)) * self.ratio2,
-            "Lb4p": stad_p(bdy_part["right_wrist_width"], bdy_part["right_wrist_width"] / 2) * self.ratio2,
-            #"Lb4p": stad_p(bdy_part["right_wrist_width"] * self.ratio2, bdy_part_tuck["left_wrist_width"] * self.ratio_tuck) ,
-            "Lb5p": stad_p(max_perp(bdy_part["right_base_of_thumb"], bdy_part["right_base_of_thumb"] + np.array([1, 0]), edges, image) * self.ratio2, 0),
-            "Lb6p": stad_p(bdy_part["right_knuckles_width"], bdy_part["right_knuckles_width"] / 3) * self.ratio2,
-            "Lb7p": stad_p(bdy_part["left_nails_width"], bdy_part["right_nails_width"] / 4) * self.ratio2,
-
-            "Lb4w": bdy_part["right_wrist_width"] * self.ratio2,
-            "Lb5w": max_perp(bdy_part["right_base_of_thumb"], bdy_part["right_base_of_thumb"] + np.array([1, 0]), edges, image) * self.ratio2,
-            "Lb6w": max_perp(bdy_part["right_knuckles"], bdy_part["right_wrist"], edges, image) * self.ratio2,
-            "Lb7w": max_perp(bdy_part["right_nails"], bdy_part["right_wrist"], edges, image) * self.ratio2,
-
-            "Lj1L": np.linalg.norm(bdy_part["left_hip"] - bdy_part["left_crotch"]) * self.ratio_bottom,
-            # Not needed"Lj2L": (np.linalg.norm(body_parts_pos["left_hip"] - body_par&ts_pos["left_knee"])) / 2,
-            "Lj3L": np.linalg.norm(bdy_part["left_hip"] - bdy_part["left_knee"]) * self.ratio_bottom,
-            "Lj4L": np.linalg.norm(bdy_part["left_hip"] - bdy_part["left_maximum_calf"]) * self.ratio_bottom,
-            "Lj5L": np.linalg.norm(bdy_part_r_side["right_hip"] - bdy_part_r_side["right_ankle"]) * self.ratio_r_side,
-            "Lj6L": 1.0,
-            # Not measured "Lj7L": np.linalg.norm(body_parts_pos["left_ankle"] - body_parts_pos["left_arch"]),
-            "Lj8L": np.linalg.norm(bdy_part_tuck["right_ankle"] - bdy_part_tuck["right_ball"]) * self.ratio_tuck2,
-            "Lj9L": np.linalg.norm(bdy_part_tuck["right_ankle"] - bdy_part_tuck["right_toe_nail"]) * self.ratio_tuck2,
-
-            # Not measured "Lj0p":,
-            "Lj1p": circle_p(bdy_part["crotch_width"]),
-            "Lj2p": circle_p(max_perp(bdy_part["right_mid_thigh"], bdy_part["right_hip"], edges_short, image)) * self.ratio_bottom,
-            "Lj3p": circle_p(max_perp(bdy_part["right_knee"], bdy_part["right_hip"], edges, image)) * self.ratio_bottom,
-            "Lj4p": circle_p(max_perp(bdy_part["right_maximum_calf"], bdy_part["right_knee"], edges, image)) * self.ratio_bottom,
-            "Lj5p": circle_p(max_perp(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_knee"], edges_tuck,image_tuck)) * self.ratio_tuck,
-            "Lj6p": stad_p(max_perp(bdy_part_r_tuck["right_ankle"], bdy_part_r_tuck["right_toe_nail"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck,
-                           max_perp(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_toe_nail"], edges_tuck, image_tuck) * self.ratio_tuck),
-            "Lj7p": stad_p(max_perp(bdy_part_tuck["right_arch"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_arch"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-            "Lj8p": stad_p(max_perp(bdy_part_tuck["right_ball"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_ball"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-            "Lj9p": stad_p(max_perp(bdy_part_tuck["right_toe_nail"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_ball"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-
-            "Lj8w": max_perp(bdy_part_tuck["right_ball"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-            "Lj9w": max_perp(bdy_part_tuck["right_toe_nail"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-
-            "Lj6d": max_perp(bdy_part_r_tuck["right_ankle"], bdy_part_r_tuck["right_knee"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck,
-
-            "Lk1L": get_length(bdy_part["right_hip"], bdy_part["right_crotch"], image) * self.ratio_bottom,
-            # Not measured "Lk2L"
-            "Lk3L": get_length(bdy_part["right_hip"], bdy_part["right_knee"], image) * self.ratio_bottom,
-            "Lk4L": get_length(bdy_part["right_hip"], bdy_part["right_maximum_calf"], image) * self.ratio_bottom,
-            "Lk5L": get_length(bdy_part_r_side["right_hip"], bdy_part_r_side["right_ankle"], image_r_side) * self.ratio_r_side,
-            "Lk6L": 1.0,
-            # Not measured "Lk7L",
-            "Lk8L": get_length(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_ball"], image_tuck) * self.ratio_tuck2,
-            "Lk9L": get_length(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_toe_nail"], image_tuck) * self.ratio_tuck2,
-
-            # Not measured "Lk0p",
-            "Lk1p": circle_p(bdy_part["crotch_width"]),
-            "Lk2p": circle_p(max_perp(bdy_part["right_mid_thigh"], bdy_part["right_hip"], edges_short, image)) * self.ratio_bottom,
-            "Lk3p": circle_p(max_perp(bdy_part["right_knee"], bdy_part["right_hip"], edges, image)) * self.ratio_bottom,
-            "Lk4p": circle_p(max_perp(bdy_part["right_maximum_calf"], bdy_part["right_knee"], edges, image)) * self.ratio_bottom,
-            "Lk5p": circle_p(max_perp(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_knee"], edges_tuck, image_tuck)) * self.ratio_tuck,
-            "Lk6p": stad_p(max_perp(bdy_part_r_tuck["right_ankle"], bdy_part_r_tuck["right_toe_nail"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck,
-                           max_perp(bdy_part_tuck["right_ankle"], bdy_part_tuck["right_toe_nail"], edges_tuck, image_tuck) * self.ratio_tuck),
-            "Lk7p": stad_p(max_perp(bdy_part_tuck["right_arch"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_arch"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-            "Lk8p": stad_p(max_perp(bdy_part_tuck["right_ball"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_ball"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-            "Lk9p": stad_p(max_perp(bdy_part_tuck["right_toe_nail"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-                           max_perp(bdy_part_r_tuck["right_ball"], bdy_part_r_tuck["right_ankle"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck),
-
-            "Lk8w": max_perp(bdy_part_tuck["right_ball"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-            "Lk9w": max_perp(bdy_part_tuck["right_toe_nail"], bdy_part_tuck["right_ankle"], edges_tuck, image_tuck) * self.ratio_tuck,
-
-            "Lk6d": max_perp(bdy_part_r_tuck["right_ankle"], bdy_part_r_tuck["right_knee"], edges_l_tuck, image_r_tuck) * self.ratio_r_tuck,
+    def _measurements(self, state: dict, edges_backend: str, view_keys: dict):
+        """
+        Measure the segments of the model, the measurements are drawn on the images. The primitives (and the
+        image) of the views that did not change since a previous run are taken from the cache, so only the
+        measurements depending on the views that changed are measured again.
+        """
+        landmarks, drawn = state["landmarks"], state.setdefault("drawn", {})
+        # every measurement is defined in src/utils/measurements.py, the shared primitives are measured once
+        views, primitives, measured = {}, {}, []
+        measurements = MeasurementGraph(views=views, ratios=vars(self), primitives=primitives)
+        needed = measurements.dependencies([*YEADON_MEASUREMENTS, *ACROBATIC_MARKERS, *DRAWN_MEASUREMENTS])
+        for view in VIEWS:
+            view_primitives = [primitive for primitive in needed if primitive[1] == view]
+            cached = load_arrays(view_keys[view], ("primitive_names", "primitives", "measured"))
+            if cached is not None:
+                values = dict(zip(cached["primitive_names"], cached["primitives"]))
+                if all(_primitive_name(primitive) in values for primitive in view_primitives):
+                    primitives.update({primitive: values[_primitive_name(primitive)] for primitive in view_primitives})
+                    drawn[view] = np.array(cached["measured"])
+                    views[view] = (landmarks[view], None, drawn[view])
+                    continue
+            edges = self._edges(state, view, edges_backend) if LINE_SIZES[view] is not None else None
+            drawn.setdefault(view, np.array(state["images"][view]))
+            views[view] = (landmarks[view], edges, drawn[view])
+            measured.append(view)
+        # the width of the left wrist on the tuck view is only drawn
+        measurements.evaluate(DRAWN_MEASUREMENTS)
+        output = {
+            "measurements": measurements.evaluate(YEADON_MEASUREMENTS),
+            # For acrobatic model we need pelvis, knuckle, pike_hand and tuck_hand
+            "markers": measurements.evaluate(ACROBATIC_MARKERS),
+            "drawn": drawn,
         }
-        # For acrobatic model we need pelvis, knuckle, pike_hand and tuck_hand
-        pelvis = abs(bdy_part["left_hip"][1] - bdy_part["top_of_head"][1]) * self.ratio / 100
-        knuckle = self.keypoints["Lb6L"] / 100
-        pike_hand = np.linalg.norm(bdy_part_pike["right_knee"] - bdy_part_pike["right_hand"]) * self.ratio_pike / 100
-        get_length(bdy_part_pike["right_knee"], bdy_part_pike["right_hand"], image_pike)
-        tuck_hand = abs(bdy_part_r_tuck["right_knee"][1] - bdy_part_r_tuck["right_knuckle"][1]) * self.ratio_r_tuck / 100
-        get_length(bdy_part_r_tuck["right_knee"], np.array([bdy_part_r_tuck["right_knee"][0], bdy_part_r_tuck["right_knuckle"][1]]), image_r_tuck)
-        generate_yml(pelvis, knuckle, pike_hand, tuck_hand)
-        save_img(image, image_r_side, image_tuck, image_r_tuck, image_pike, impath_front.split('/')[-1].split('_')[0])
+        for view in measured:
+            view_primitives = [primitive for primitive in measurements.primitives if primitive[1] == view]
+            store_arrays(
+                view_keys[view],
+                primitive_names=np.array([_primitive_name(primitive) for primitive in view_primitives], dtype=str),
+                primitives=np.array([measurements.primitives[primitive] for primitive in view_primitives], dtype=float),
+                measured=drawn[view],
+            )
+        return output
+
+    def _outputs(self, state: dict, name: str, mass: float, output_dir: str = ""):
+        """
+        Write the yml of the acrobatic model, the images with the measurements and the .txt of the person.
+        """
+        self.keypoints = dict(state["measurements"])
+        generate_yml(**state["markers"], path=tech_opt_path(name, output_dir))
+        save_img(*(state["drawn"][view] for view in VIEWS), name, output_dir)
         self._round_keypoints()
-        self._create_txt(f"{impath_front.split('/')[-1].split('_')[0]}.txt", mass)
+        self._create_txt(os.path.join(output_dir, f"{name}.txt"), mass)
         self._verify_keypoints()
+        return {}
+
 
     def _create_txt(self, file_name: str, mass):
         """
@@ -501,6 +571,12 @@ class YeadonModel:
 
 
 def main():
+    # im2meas batch <root> computes every athlete of a folder (see src/batch.py)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from src.batch import main as batch_main
+
+        return batch_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="Im2meas")
 
     parser.add_argument("front_img", type=str, help="Path to the front image")
@@ -509,7 +585,7 @@ def main():
     parser.add_argument("side_img", type=str, help="Path to the side image")
     parser.add_argument("tuck_img", type=str, help="Path to the tuck image")
     # This is used because some phones rotate the images taken from the app, so set to 1 if you want to rotate it back to the original state
-    parser.add_argument("--rotation", type=int, default=0, help="Enter 1 if you need to rotate the images")
+    parser.add_argument("--rotation", type=int, default=0, help="Enter 1 if you need to rotate the images (otherwise their EXIF orientation is used)")
 
     parser.add_argument("-m", "--mass", type=float, default=0, help="Enter the mass of the person")
     # Used if you want to use the calibration because it can be wrong
@@ -517,10 +593,18 @@ def main():
     # Used to change the distance between the camera and the wall just in case
     parser.add_argument("--distance", type=int, default=350, help="Enter the distance between the camera and the wall")
     parser.add_argument("-l", "--luminosity", type=int, default=0, help="Enter 1 if you want to increase the luminosity of the images")
-
+    parser.add_argument("-e", "--edges", type=str, default="raster", choices=["raster", "contour"], help="Enter contour to measure on the contour polylines instead of the edges images")
+    parser.add_argument("--torch_threads", type=int, default=0, help="Enter the number of threads used by the pose network (0 for the torch default)")
+    parser.add_argument("--rembg_model", type=str, default=REMBG_MODEL, help="Enter the rembg model removing the background (u2net, u2netp, silueta, ...)")
+    parser.add_argument("--plate", type=str, default=None, help="Enter the path to a photo of the empty rig to remove the backgrounds by subtraction instead of rembg")
+    parser.add_argument("-w", "--workers", type=int, default=VIEW_WORKERS, help="Enter the number of processes preprocessing the views (0 to preprocess them one after the other)")
+    parser.add_argument("-p", "--pose", type=str, default="torch", choices=["torch", "onnx", "onnx-int8"], help="Enter the backend running the pose network")
+    parser.add_argument("--resume", action="store_true", help="Restart from the last stage saved by a previous run of the same images")
+    parser.add_argument("--until", type=str, default=None, choices=STAGES, help="Enter the last stage to compute (to debug the previous ones)")
 
     args = parser.parse_args()
-    yeadon = YeadonModel(args.front_img, args.pike_img, args.right_tuck_img, args.side_img, args.tuck_img, args.rotation, args.mass, args.calibration, args.distance, args.luminosity)
+    configure_predictor_pool(torch_threads=args.torch_threads, backend=args.pose)
+    yeadon = YeadonModel(args.front_img, args.pike_img, args.right_tuck_img, args.side_img, args.tuck_img, args.rotation, args.mass, args.calibration, args.distance, args.luminosity, args.edges, args.rembg_model, args.plate, args.workers, args.resume, args.until)
 
 
     return yeadon
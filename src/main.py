@@ -5,11 +5,22 @@ import uvicorn
 from fastapi import FastAPI
 from src.im2meas import *
 from src.biomake.biomake_models import *
+from src.utils.pose import get_predictor_pool
+from src.utils.segmentation import get_session
 from pydantic import BaseModel
 
 app = FastAPI()
 
 
+@app.on_event("startup")
+def load_predictors():
+    # load the pose network once, the size of the pool, the torch threads and the backend are set with
+    # IM2MEAS_PREDICTORS, IM2MEAS_TORCH_THREADS and IM2MEAS_POSE_BACKEND
+    get_predictor_pool()
+    # the rembg session (IM2MEAS_REMBG_MODEL) is shared by every request too
+    get_session()
+
+
 class YeadonModelRequest(BaseModel):
     impath_front: str
     impath_pike: str
@@ -22,15 +33,16 @@ class YeadonModelRequest(BaseModel):
     distance: int
     luminosity: int
 
+# not async so the requests run in the threadpool and use the predictors of the pool concurrently
 @app.post("/process_yeadon_model/")
-async def process_yeadon_model(request_data: YeadonModelRequest):
+def process_yeadon_model(request_data: YeadonModelRequest):
     try:
         yea = YeadonModel(request_data.impath_front, request_data.impath_pike, request_data.impath_r_tuck,
                           request_data.impath_side, request_data.impath_tuck,
                           request_data.rotation, request_data.mass, request_data.calibration,
                           request_data.distance, request_data.luminosity)
-        bioModOptions = "src/biomake/tech_opt.yml"
         name = f"{request_data.impath_front.split('/')[-1].split('_')[0]}"
+        bioModOptions = tech_opt_path(name)
         human = yeadon.Human(f"{name}.txt")
         BioHuman, human_options, segments_options = parse_biomod_options(bioModOptions)
         biohuman = BioHuman(human, **human_options, **segments_options)
@@ -47,7 +59,7 @@ if __name__ == "__main__":
     parser.add_argument("side_img", type=str, help="Path to the side image")
     parser.add_argument("tuck_img", type=str, help="Path to the tuck image")
     # This is used because some phones rotate the images taken from the app, so set to 1 if you want to rotate it back to the original state
-    parser.add_argument("--rotation", type=int, default=1, help="Enter 1 if you need to rotate the images")
+    parser.add_argument("--rotation", type=int, default=1, help="Enter 1 if you need to rotate the images (otherwise their EXIF orientation is used)")
 
     parser.add_argument("-m", "--mass", type=float, default=0, help="Enter the mass of the person")
     # Used if you want to use the calibration because it can be wrong
@@ -0,0 +1,120 @@
+import os
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+
+# the results computed for an input image are kept on disk (one folder per image content and parameters) so a
+# run that only changes the downstream parameters (mass, distance, biomake options) does not compute them again
+CACHE_DIR = os.environ.get("IM2MEAS_CACHE_DIR", ".im2meas_cache")
+CACHE_SIZE = int(os.environ.get("IM2MEAS_CACHE_SIZE", 2 * 1024 ** 3))  # bytes, the least recently used are removed
+CACHE_ENABLED = os.environ.get("IM2MEAS_CACHE", "1") != "0"
+
+_lock = threading.Lock()
+
+
+def content_key(path: str, **parameters):
+    """
+    Return the cache key of an input image: the hash of its content and of the parameters of its processing.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        digest.update(file.read())
+    for name, value in sorted(parameters.items()):
+        if isinstance(value, np.ndarray):
+            value = hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest()
+        digest.update(f"{name}={value};".encode())
+    return digest.hexdigest()
+
+
+def derived_key(*keys, **parameters):
+    """
+    Return the cache key of a result computed from the entries of other keys and from parameters.
+    """
+    digest = hashlib.sha1()
+    for key in keys:
+        digest.update(f"{key};".encode())
+    for name, value in sorted(parameters.items()):
+        digest.update(f"{name}={value};".encode())
+    return digest.hexdigest()
+
+
+def save_npz(path: str, **arrays):
+    """
+    Write a npz file atomically so a process never reads a file another one is writing.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, path)
+
+
+def load_arrays(key: str, names: tuple):
+    """Load the arrays of an entry as memory-mapped files.
+
+    Parameters
+    ----------
+    key : str
+        The key given by content_key.
+    names : tuple
+        The names of the arrays.
+
+    Returns
+    -------
+    dict
+        The read-only arrays by name, None if the cache is disabled or one of them is missing.
+    """
+    if not CACHE_ENABLED or key is None:
+        return None
+    directory = os.path.join(CACHE_DIR, key)
+    paths = {name: os.path.join(directory, f"{name}.npy") for name in names}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    try:
+        arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+        # the date of the folder is the last use of the entry
+        os.utime(directory)
+    except (OSError, ValueError):
+        # removed by the eviction of another process
+        return None
+    return arrays
+
+
+def store_arrays(key: str, **arrays):
+    """
+    Save arrays in the entry of a key (each file is written atomically), then evict the least recently used
+    entries above CACHE_SIZE.
+    """
+    if not CACHE_ENABLED or key is None:
+        return
+    directory = os.path.join(CACHE_DIR, key)
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        temporary = os.path.join(directory, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        np.save(temporary, np.asarray(array))
+        os.replace(temporary, os.path.join(directory, f"{name}.npy"))
+    os.utime(directory)
+    evict()
+
+
+def evict(size: int = CACHE_SIZE):
+    """
+    Remove the least recently used entries until the cache is smaller than size (bytes).
+    """
+    with _lock:
+        entries = []
+        for entry in os.scandir(CACHE_DIR):
+            try:
+                if entry.is_dir():
+                    files = [file for file in os.scandir(entry.path) if file.is_file()]
+                    entries.append((entry.stat().st_mtime, sum(file.stat().st_size for file in files), entry.path))
+            except FileNotFoundError:
+                # removed by another process
+                continue
+        total = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if total <= size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= entry_size
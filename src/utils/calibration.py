@@ -0,0 +1,255 @@
+import os
+import re
+import glob
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+import cv2 as cv
+
+from src.utils.cache import save_npz
+
+# the calibrations are stored in one folder per device: the intrinsics and the undistortion maps of every size
+CALIBRATION_DIR = os.environ.get("IM2MEAS_CALIBRATION_DIR", "calibration")
+CHESSBOARD_DIR = "img/chessboard"
+CHESSBOARD_SIZE = (5, 5)  # the inner corners of the calibration chessboard, change this to match your pattern
+DEFAULT_DEVICE = "default"  # the device of the images without camera model in their EXIF
+LEGACY_CALIBRATION = "camera_calibration.npz"  # the single calibration file used before the store
+EXIF_MAKE, EXIF_MODEL = 0x010F, 0x0110
+
+_intrinsics = {}
+_maps = {}
+_lock = threading.Lock()
+
+
+def device_name(pil_im):
+    """
+    Return the name of the device that took an image (the camera make and model of its EXIF).
+    """
+    exif = pil_im.getexif()
+    name = " ".join(str(exif.get(tag, "")).strip("\x00 ") for tag in (EXIF_MAKE, EXIF_MODEL)).strip()
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name) or DEFAULT_DEVICE
+
+
+def _chessboard_images(device: str):
+    """
+    Return the img/chessboard images taken by a device.
+    """
+    chessboard_imgs = sorted(glob.glob(os.path.join(CHESSBOARD_DIR, "*.jpg")))
+    return [fname for fname in chessboard_imgs if device_name(Image.open(fname)) == device]
+
+
+def _file_hash(fname: str):
+    """
+    Return the SHA-1 of the content of a file.
+    """
+    with open(fname, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def detect_corners(fname: str):
+    """Find the chessboard corners of a calibration image (on the resized image, refined with cornerSubPix).
+
+    Parameters
+    ----------
+    fname : str
+        The path to the chessboard image.
+
+    Returns
+    -------
+    numpy array
+        The corners in the full resolution image, None if the chessboard is not found.
+    tuple
+        The (width, height) of the full resolution image.
+    """
+    # imported here since image_config uses the store
+    from src.utils.image_config import _open_resized
+
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    pil_im, min_ratio = _open_resized(fname)
+    gray = cv.cvtColor(np.asarray(pil_im), cv.COLOR_RGB2GRAY)
+    size = Image.open(fname).size
+    ret, corners = cv.findChessboardCorners(gray, CHESSBOARD_SIZE, None)
+    if not ret:
+        return None, size
+    corners2 = cv.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+    return corners2 / min_ratio, size
+
+
+def _cached_corners(fname: str):
+    """
+    Return the path of the corners cache of an image (by the hash of its content) and its content if it exists.
+    """
+    path = os.path.join(CALIBRATION_DIR, "corners", f"{_file_hash(fname)}.npz")
+    if not os.path.exists(path):
+        return path, None
+    cached = np.load(path)
+    corners = cached["corners"] if cached["found"] else None
+    return path, (corners, tuple(cached["size"]))
+
+
+def calibrate(chessboard_imgs: list, workers: int = None, device: str = DEFAULT_DEVICE):
+    """Compute the camera matrix and the distortion coefficients from chessboard images.
+
+    The corners of the images are found in a process pool and cached by the hash of the images, so only the
+    new images are processed when the calibration is computed again.
+
+    Parameters
+    ----------
+    chessboard_imgs : list of str
+        The paths to the chessboard images (taken by the same device).
+    workers : int
+        The number of processes finding the corners (the number of CPUs if None).
+    device : str
+        The device that took the images (for the error messages).
+
+    Returns
+    -------
+    numpy array
+        The camera matrix.
+    numpy array
+        The distortion coefficients.
+    dict
+        The reprojection error (pixels) of each image where the chessboard was found.
+    """
+    if (len(chessboard_imgs) == 0):
+        print("You need a chessboards folder with images with chessboard in it")
+    results, missing = {}, {}
+    for fname in chessboard_imgs:
+        path, cached = _cached_corners(fname)
+        if cached is None:
+            missing[fname] = path
+        else:
+            results[fname] = cached
+    if missing:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for fname, (corners, size) in zip(missing, executor.map(detect_corners, missing)):
+                results[fname] = corners, size
+                found = corners is not None
+                save_npz(missing[fname], found=found, corners=corners if found else np.zeros((0, 2)), size=size)
+
+    objp = np.zeros((CHESSBOARD_SIZE[0] * CHESSBOARD_SIZE[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:CHESSBOARD_SIZE[0], 0:CHESSBOARD_SIZE[1]].T.reshape(-1, 2)
+    found = [fname for fname in chessboard_imgs if results[fname][0] is not None]
+    for fname in chessboard_imgs:
+        if results[fname][0] is None:
+            print(f"Chessboard not found in {fname}")
+    if not found:
+        raise ValueError(f"No chessboard found in the images of the device {device} in {CHESSBOARD_DIR}")
+    img_points = [results[fname][0].astype(np.float32) for fname in found]
+    obj_points = [objp] * len(found)
+    ret, mtx, dist, rvecs, tvecs = cv.calibrateCamera(obj_points, img_points, results[found[0]][1], None, None)
+
+    errors = {}
+    for fname, points, rvec, tvec in zip(found, img_points, rvecs, tvecs):
+        projected, _ = cv.projectPoints(objp, rvec, tvec, mtx, dist)
+        errors[fname] = float(np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - points.reshape(-1, 2)) ** 2, axis=1))))
+    return mtx, dist, errors
+
+
+def calibrate_device(device: str, workers: int = None):
+    """
+    Compute the calibration of a device from its img/chessboard images (all of them if no image has its camera
+    model), save it in the store (the undistortion maps of the old calibration are removed) and print the
+    reprojection errors.
+    """
+    chessboard_imgs = _chessboard_images(device) or sorted(glob.glob(os.path.join(CHESSBOARD_DIR, "*.jpg")))
+    mtx, dist, errors = calibrate(chessboard_imgs, workers, device)
+    for fname, error in errors.items():
+        print(f"{fname}: reprojection error {error:.3f} px")
+    print(f"{device}: mean reprojection error {np.mean(list(errors.values())):.3f} px over {len(errors)} images")
+    directory = os.path.join(CALIBRATION_DIR, device)
+    save_npz(os.path.join(directory, "intrinsics.npz"), mtx=mtx, dist=dist)
+    for path in glob.glob(os.path.join(directory, "maps_*.npz")):
+        os.remove(path)
+    with _lock:
+        _intrinsics[device] = mtx, dist
+        for key in [key for key in _maps if key[0] == device]:
+            del _maps[key]
+    return mtx, dist
+
+
+def camera_calibration(device: str = DEFAULT_DEVICE):
+    """
+    Return the camera matrix and the distortion coefficients of a device, computed from its img/chessboard
+    images the first time and then loaded from the store. Without images of the device, the old
+    camera_calibration.npz is used if it exists, all the chessboard images otherwise.
+    """
+    with _lock:
+        if device in _intrinsics:
+            return _intrinsics[device]
+    path = os.path.join(CALIBRATION_DIR, device, "intrinsics.npz")
+    if os.path.exists(path):
+        calibration_data = np.load(path)
+        mtx, dist = calibration_data['mtx'], calibration_data['dist']
+    else:
+        chessboard_imgs = _chessboard_images(device)
+        if not chessboard_imgs and os.path.exists(LEGACY_CALIBRATION):
+            calibration_data = np.load(LEGACY_CALIBRATION)
+            mtx, dist = calibration_data['mtx'], calibration_data['dist']
+        else:
+            return calibrate_device(device)
+    with _lock:
+        _intrinsics[device] = mtx, dist
+    return mtx, dist
+
+
+def calibration_hash(device: str = DEFAULT_DEVICE):
+    """
+    Return a short hash of the intrinsics of a device, it changes when the device is calibrated again.
+    """
+    mtx, dist = camera_calibration(device)
+    return hashlib.sha1(np.ascontiguousarray(mtx).tobytes() + np.ascontiguousarray(dist).tobytes()).hexdigest()[:12]
+
+
+def undistort_maps(device: str, size: tuple, scale: float = 1):
+    """Return the undistortion maps of a device for the images of a given size (computed once, then loaded
+    from the store).
+
+    Parameters
+    ----------
+    device : str
+        The device name given by device_name.
+    size : tuple
+        The (width, height) of the images to undistort.
+    scale : float
+        The ratio between this size and the size of the full resolution images (the camera matrix is scaled so a
+        resized image is undistorted like the full resolution one).
+
+    Returns
+    -------
+    tuple
+        The two maps given to cv.remap.
+    """
+    key = (device, size, scale)
+    with _lock:
+        if key in _maps:
+            return _maps[key]
+    path = os.path.join(CALIBRATION_DIR, device, f"maps_{size[0]}x{size[1]}_{scale:.6f}.npz")
+    if os.path.exists(path):
+        maps_data = np.load(path)
+        maps = maps_data["map1"], maps_data["map2"]
+    else:
+        mtx, dist = camera_calibration(device)
+        full_size = (int(round(size[0] / scale)), int(round(size[1] / scale)))
+        newcameramtx, roi = cv.getOptimalNewCameraMatrix(mtx, dist, full_size, 1, full_size)
+        scaling = np.diag([scale, scale, 1])
+        maps = cv.initUndistortRectifyMap(scaling @ mtx, dist, None, scaling @ newcameramtx, size, cv.CV_16SC2)
+        save_npz(path, map1=maps[0], map2=maps[1])
+    with _lock:
+        _maps[key] = maps
+    return maps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate a phone from the images of img/chessboard")
+    parser.add_argument("-d", "--device", type=str, default=None, help="Enter the device to calibrate (the one of the first image by default)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Enter the number of processes finding the corners (the number of CPUs by default)")
+    args = parser.parse_args()
+
+    images = sorted(glob.glob(os.path.join(CHESSBOARD_DIR, "*.jpg")))
+    calibrate_device(args.device or device_name(Image.open(images[0])), args.workers)
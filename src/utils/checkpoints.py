@@ -0,0 +1,93 @@
+import os
+import hashlib
+
+import numpy as np
+
+from src.utils.cache import save_npz
+
+# the output of each stage of a run is kept (one folder per person) so a failed run restarts from its last good stage
+RUN_DIR = os.environ.get("IM2MEAS_RUN_DIR", ".im2meas_runs")
+STAGES = ("segment", "pose", "scale", "landmarks", "measurements", "outputs")
+# the outputs stage writes the files of the person from the state of the others, it always runs again
+CHECKPOINTED = STAGES[:-1]
+
+
+def run_dir(name: str, output_dir: str = ""):
+    """
+    Return the folder of the run of a person: its checkpoints and its intermediate outputs (the persons with the
+    same name in different output folders do not share it).
+    """
+    return os.path.join(RUN_DIR, output_dir, name)
+
+
+def run_signature(**parameters):
+    """
+    Return the hash of the parameters of a run, the checkpoints of a run with other parameters are never resumed.
+    """
+    digest = hashlib.sha1()
+    for name, value in sorted(parameters.items()):
+        digest.update(f"{name}={value};".encode())
+    return digest.hexdigest()
+
+
+def _flatten(values: dict, prefix: str = ""):
+    arrays = {}
+    for name, value in values.items():
+        if isinstance(value, dict):
+            arrays.update(_flatten(value, f"{prefix}{name}/"))
+        else:
+            arrays[f"{prefix}{name}"] = value
+    return arrays
+
+
+def _unflatten(arrays: dict):
+    values = {}
+    for path, value in arrays.items():
+        *parents, name = path.split("/")
+        node = values
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        # the numbers are saved as 0-d arrays
+        node[name] = value[()] if value.ndim == 0 else value
+    return values
+
+
+def _stage_path(run_dir: str, stage: str):
+    return os.path.join(run_dir, f"{stage}.npz")
+
+
+def save_stage(run_dir: str, stage: str, signature: str, **values):
+    """
+    Save the output of a stage (nested dicts of arrays and numbers) with the signature of its run, the
+    checkpoints of the next stages are removed since they were computed from an older output.
+    """
+    for next_stage in STAGES[STAGES.index(stage) + 1:]:
+        if os.path.exists(_stage_path(run_dir, next_stage)):
+            os.remove(_stage_path(run_dir, next_stage))
+    save_npz(_stage_path(run_dir, stage), signature=signature, **_flatten(values))
+
+
+def load_stage(run_dir: str, stage: str, signature: str):
+    """Load the output of a stage saved by save_stage.
+
+    Parameters
+    ----------
+    run_dir : str
+        The folder of the run.
+    stage : str
+        One of STAGES.
+    signature : str
+        The signature of the run given by run_signature.
+
+    Returns
+    -------
+    dict
+        The output of the stage, None if it was not saved or if it was saved by a run with other parameters.
+    """
+    path = _stage_path(run_dir, stage)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data["signature"]) != signature:
+            return None
+        return _unflatten({name: data[name] for name in data.files if name != "signature"})
@@ -0,0 +1,159 @@
+import numpy as np
+import cv2 as cv
+
+from src.utils.ray_casting import _ray_cells
+
+CELL_SIZE = 16  # the size (in pixels) of the cells of the segments grid
+
+
+class ContourEdges:
+    """The edges of a view kept as the polylines of the silhouette contours, indexed in a uniform grid.
+
+    Rays cast against it are intersected analytically with the contour segments of the grid cells they cross,
+    so the hits have a sub-pixel precision. It has the same interface as the edges array (shape, indexing and
+    numpy functions go through a raster of the contours drawn on demand) so every landmark finder can use it.
+
+    Attributes
+    ----------
+    shape : tuple
+        The shape of the edges image.
+    segments : numpy array
+        The contour segments, shape (S, 4), as [x1, y1, x2, y2].
+    """
+
+    def __init__(self, contours, shape: tuple, line_size: int, cell_size: int = CELL_SIZE):
+        """
+        Parameters
+        ----------
+        contours : list of numpy arrays
+            The contours given by cv.findContours.
+        shape : tuple
+            The shape of the image the contours were found in.
+        line_size : int
+            The thickness of the contours when they are drawn as a raster.
+        cell_size : int
+            The size (in pixels) of the cells of the segments grid.
+        """
+        self.shape = tuple(shape[:2])
+        self.cell_size = cell_size
+        self._contours = contours
+        self._line_size = line_size
+        self._lines = []
+        self._raster = None
+        segments = [np.zeros((0, 4))]
+        for contour in contours:
+            points = contour.reshape(-1, 2).astype(float)
+            # the contours are closed polylines
+            segments.append(np.hstack((points, np.roll(points, -1, axis=0))))
+        self.segments = np.concatenate(segments)
+        self._index_segments()
+
+    def _index_segments(self):
+        """
+        Sort the segments by the grid cells overlapped by their bounding box (padded by one pixel).
+        """
+        grid_height = int(np.ceil(self.shape[0] / self.cell_size)) + 1
+        grid_width = int(np.ceil(self.shape[1] / self.cell_size)) + 1
+        self._grid_shape = (grid_height, grid_width)
+        x_min = np.minimum(self.segments[:, 0], self.segments[:, 2]) - 1
+        x_max = np.maximum(self.segments[:, 0], self.segments[:, 2]) + 1
+        y_min = np.minimum(self.segments[:, 1], self.segments[:, 3]) - 1
+        y_max = np.maximum(self.segments[:, 1], self.segments[:, 3]) + 1
+        col_min = np.clip(np.floor(x_min / self.cell_size), 0, grid_width - 1).astype(int)
+        col_max = np.clip(np.floor(x_max / self.cell_size), 0, grid_width - 1).astype(int)
+        row_min = np.clip(np.floor(y_min / self.cell_size), 0, grid_height - 1).astype(int)
+        row_max = np.clip(np.floor(y_max / self.cell_size), 0, grid_height - 1).astype(int)
+
+        cells, segment_ids = [], []
+        for i in range(len(self.segments)):
+            rows, cols = np.mgrid[row_min[i] : row_max[i] + 1, col_min[i] : col_max[i] + 1]
+            cells.append((rows * grid_width + cols).ravel())
+            segment_ids.append(np.full(rows.size, i))
+        cells = np.concatenate(cells) if cells else np.zeros(0, dtype=int)
+        segment_ids = np.concatenate(segment_ids) if segment_ids else np.zeros(0, dtype=int)
+        order = np.argsort(cells, kind="stable")
+        self._cell_segments = segment_ids[order]
+        self._cell_start = np.searchsorted(cells[order], np.arange(grid_height * grid_width + 1))
+
+    def add_line(self, p1: np.ndarray, p2: np.ndarray, thickness: int):
+        """
+        Add a segment to the edges (as cv.line would draw it on the raster).
+        """
+        self._lines.append((np.asarray(p1, dtype=int), np.asarray(p2, dtype=int), thickness))
+        self.segments = np.vstack((self.segments, np.hstack((p1, p2)).astype(float)))
+        self._raster = None
+        self._index_segments()
+
+    @property
+    def raster(self):
+        """
+        The contours drawn as a single channel uint8 edges image (255 on the edges), like thresh returns it.
+        """
+        if self._raster is None:
+            self._raster = np.zeros(self.shape, dtype=np.uint8)
+            cv.drawContours(self._raster, self._contours, -1, 255, self._line_size)
+            for p1, p2, thickness in self._lines:
+                cv.line(self._raster, p1, p2, 255, thickness)
+        return self._raster
+
+    def __getitem__(self, item):
+        return self.raster[item]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.raster, dtype=dtype)
+
+    def cast_rays(self, origins: np.ndarray, angles: np.ndarray):
+        """Find the first contour point hit by each ray, see ray_casting.cast_rays.
+
+        Parameters
+        ----------
+        origins : numpy array
+            The starting points of the rays, shape (N, 2), in the [row, column] order used by pt_from.
+        angles : numpy array
+            The angle of each ray (radians).
+
+        Returns
+        -------
+        numpy array
+            The hit points, shape (N, 2), in the (x, y) image order used by find_edge. -1 where nothing is hit.
+        numpy array
+            Boolean array of shape (N,), True if the ray hit a contour before leaving the image.
+        """
+        n_rays = origins.shape[0]
+        height, width = self.shape
+        points = np.full((n_rays, 2), -1.0)
+        # a ray starting outside the image does not hit anything (like the raster)
+        start_rows, start_cols = np.trunc(origins).astype(int).T
+        valid = (0 <= start_rows) & (start_rows < height) & (0 <= start_cols) & (start_cols < width)
+
+        # candidate segments: the ones indexed in the grid cells crossed by the ray
+        rows, cols, inside, _, _ = _ray_cells(
+            origins / self.cell_size, angles, self._grid_shape, max(self._grid_shape) + 2
+        )
+        inside &= valid[:, None]
+        ray_ids = np.broadcast_to(np.arange(n_rays)[:, None], inside.shape)[inside]
+        cells = rows[inside] * self._grid_shape[1] + cols[inside]
+        counts = self._cell_start[cells + 1] - self._cell_start[cells]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        segment_ids = self._cell_segments[np.repeat(self._cell_start[cells], counts) + offsets]
+        ray_ids = np.repeat(ray_ids, counts)
+
+        # intersection of the rays o + t * d with the segments a + u * (b - a), in the (x, y) order
+        origin = origins[ray_ids][:, ::-1]
+        direction = np.column_stack((np.sin(angles), np.cos(angles)))[ray_ids]
+        a, b = self.segments[segment_ids, :2], self.segments[segment_ids, 2:]
+        segment = b - a
+        denominator = direction[:, 0] * segment[:, 1] - direction[:, 1] * segment[:, 0]
+        offset = a - origin
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (offset[:, 0] * segment[:, 1] - offset[:, 1] * segment[:, 0]) / denominator
+            u = (offset[:, 0] * direction[:, 1] - offset[:, 1] * direction[:, 0]) / denominator
+        hit = (denominator != 0) & (t >= 0) & (0 <= u) & (u <= 1)
+
+        closest = np.full(n_rays, np.inf)
+        np.minimum.at(closest, ray_ids[hit], t[hit])
+        found = np.isfinite(closest)
+        points[found] = origins[found][:, ::-1] + np.column_stack(
+            (np.sin(angles[found]), np.cos(angles[found]))
+        ) * closest[found, None]
+        return points, found
@@ -0,0 +1,119 @@
+import numpy as np
+import cv2 as cv
+
+from src.utils.ray_casting import _traverse
+
+# pixels are truncated towards zero (the first row and column are two pixels wide), so a point is less than
+# 2 * sqrt(2) away from the integer position of its pixel used by the distance transform
+PIXEL_MARGIN = 3
+# number of grid lines traversed pixel by pixel when a ray is close to an edge
+TRAVERSE_LINES = 16
+
+
+class EdgeDistanceField:
+    """The edges of a view along with the distance from every pixel to the closest edge pixel.
+
+    The distance transform is computed once per view, then the rays cast against it jump over the empty space
+    and are only traversed pixel by pixel close to the edges: a width query costs a few array operations
+    whatever the length of the ray. The hit pixels are the same as with the edges array.
+    It can be used in place of the edges array (shape, indexing and numpy functions).
+
+    Attributes
+    ----------
+    edges : numpy array
+        The edges image, a pixel is an edge if it equals 255 (on any channel).
+    distance : numpy array
+        The distance from every pixel to the closest edge pixel (0 on the edges).
+    """
+
+    def __init__(self, edges: np.ndarray):
+        """
+        Parameters
+        ----------
+        edges : numpy array
+            The edges image (given by thresh).
+        """
+        self.edges = edges
+        self._distance = None
+
+    @property
+    def distance(self):
+        # computed on the first use, the compiled kernels (when Numba is installed) do not need it
+        if self._distance is None:
+            mask = self.edges == 255
+            if mask.ndim == 3:
+                mask = np.any(mask, axis=2)
+            self._distance = cv.distanceTransform((~mask).astype(np.uint8), cv.DIST_L2, cv.DIST_MASK_PRECISE)
+        return self._distance
+
+    @property
+    def shape(self):
+        return self.edges.shape
+
+    def __getitem__(self, item):
+        return self.edges[item]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.edges, dtype=dtype)
+
+    def cast_rays(self, origins: np.ndarray, angles: np.ndarray):
+        """Find the first edge pixel hit by each ray, see ray_casting.cast_rays.
+
+        Parameters
+        ----------
+        origins : numpy array
+            The starting points of the rays, shape (N, 2), in the [row, column] order used by pt_from.
+        angles : numpy array
+            The angle of each ray (radians).
+
+        Returns
+        -------
+        numpy array
+            The hit pixels, shape (N, 2), in the (x, y) image order used by find_edge. -1 where nothing is hit.
+        numpy array
+            Boolean array of shape (N,), True if the ray hit an edge before leaving the image.
+        """
+        n_rays = origins.shape[0]
+        height, width = self.shape[:2]
+        direction = np.column_stack((np.cos(angles), np.sin(angles)))
+        travelled = np.zeros(n_rays)
+        points = np.full((n_rays, 2), -1, dtype=int)
+        found = np.zeros(n_rays, dtype=bool)
+        pending = np.ones(n_rays, dtype=bool)
+
+        while np.any(pending):
+            index = np.flatnonzero(pending)
+            position = origins[index] + direction[index] * travelled[index, None]
+            rows, cols = np.trunc(position).astype(int).T
+            in_image = (0 <= rows) & (rows < height) & (0 <= cols) & (cols < width)
+            # a ray that left the image cannot hit anything anymore
+            pending[index[~in_image]] = False
+            index, position, rows, cols = index[in_image], position[in_image], rows[in_image], cols[in_image]
+
+            # far from the edges, jump to the closest point where an edge could be
+            clearance = np.minimum(self.distance[rows, cols], np.hypot(height, width)) - PIXEL_MARGIN
+            jump = clearance > TRAVERSE_LINES
+            travelled[index[jump]] += clearance[jump]
+
+            # close to the edges, traverse the next pixels exactly
+            near = index[~jump]
+            if len(near) == 0:
+                continue
+            near_points, near_found, near_left, near_travelled = _traverse(
+                position[~jump], angles[near], self.edges, TRAVERSE_LINES
+            )
+            points[near[near_found]] = near_points[near_found]
+            found[near] = near_found
+            pending[near[near_found | near_left]] = False
+            travelled[near] += near_travelled
+        return points, found
+
+
+def index_edges(edges):
+    """
+    Precompute the ray casting structure of the edges of a view (the distance field of an edges image,
+    a ContourEdges already indexes its segments).
+    """
+    if isinstance(edges, np.ndarray):
+        return EdgeDistanceField(edges)
+    return edges
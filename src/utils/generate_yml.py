@@ -1,4 +1,17 @@
-def generate_yml(pelvis: float, knuckle: float, pike_hand: float, tuck_hand: float):
+import os
+
+from src.utils.checkpoints import run_dir
+
+
+def tech_opt_path(name: str, output_dir: str = ""):
+    """
+    Return the path of the bioMod options of a person, in its run folder so the runs in parallel (batch, server)
+    do not overwrite each other.
+    """
+    return os.path.join(run_dir(name, output_dir), f"{name}_tech_opt.yml")
+
+
+def generate_yml(pelvis: float, knuckle: float, pike_hand: float, tuck_hand: float, path: str = "src/biomake/tech_opt.yml"):
     content = f"""
     # bioMod configuration for models used with TechOpt83
     #
@@ -133,5 +146,6 @@ def generate_yml(pelvis: float, knuckle: float, pike_hand: float, tuck_hand: flo
         Ankle:
           position: [0, 0, 0]
     """
-    with open('src/biomake/tech_opt.yml', 'w') as file:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as file:
         file.write(content)
\ No newline at end of file
@@ -1,6 +1,9 @@
 import numpy as np
 import cv2 as cv
 
+from src.utils.ray_casting import cast_rays, PolarEdgeProfile
+from src.utils.ray_kernels import kernel_edges, sweep_kernel
+
 
 def pt_from(origin: np.ndarray, angle: int, distance):
     """
@@ -15,17 +18,9 @@ def find_edge(p1: np.ndarray, angle_radians, edges: np.ndarray, save):
     """
     Find the edge pixel given a starting point, angle, and image edges.
     """
-    distance = 0
-    while True:
-        x, y = pt_from(p1, angle_radians, distance)
-        if not (0 <= x < edges.shape[0] and 0 <= y < edges.shape[1]):
-            break
-
-        hit_zone = edges[x, y] == 255
-        if np.any(hit_zone):
-            save.append((y, x))
-            break
-        distance += 0.01
+    points, found = cast_rays(p1, angle_radians, edges)
+    if found[0]:
+        save.append(tuple(points[0]))
     return save
 
 
@@ -47,15 +42,10 @@ def get_max_approx(top_arr, bottom_arr):
 
     vector = np.array(top_arr) - np.array(bottom_arr)
     norms = np.linalg.norm(vector, axis=1)
-    max_norm = norms[0]
-    save_index = 0
-
-    for i in range(len(top_arr)):
-        if norms[i] >= max_norm and norms[i] <= norms[0] * 1.5:
-            max_norm = norms[i]
-            save_index = i
-
-    return save_index
+    # only the norms up to 1.5 times the first one are kept, the last of the maximum ones is chosen
+    candidates = norms <= norms[0] * 1.5
+    is_max = candidates & (norms == np.max(norms[candidates]))
+    return len(norms) - 1 - np.argmax(is_max[::-1])
 
 
 def vector_angle(vector: np.ndarray, plus: int):
@@ -66,26 +56,24 @@ def vector_angle(vector: np.ndarray, plus: int):
     return angle + np.pi / 2 if plus else angle - np.pi / 2
 
 
-def get_maximum_range(angle_radians, result, edges):
+def get_maximum_ranges(angles_radians, result, edges):
     """
-    Get the range of points along a given angle within image boundaries.
+    Cast one ray per point of result (each with its own angle) in a single call.
+    Return the hit points as an (N, 2) array, the distance between each point and its hit, and whether it hit an edge.
     """
-    save = []
+    result = np.asarray(result, dtype=float).reshape(-1, 2)
+    points, found = cast_rays(result, angles_radians, edges)
+    lengths = np.linalg.norm(points[:, ::-1] - result, axis=1)
+    lengths[~found] = np.nan
+    return points, lengths, found
 
-    for point in result:
-        distance = 0
-        while True:
-            x, y = pt_from(point, angle_radians, distance)
-            if not (0 <= x < edges.shape[0] and 0 <= y < edges.shape[1]):
-                break
 
-            hit_zone = edges[x, y] == 255
-            if np.any(hit_zone):
-                save.append((y, x))
-                break
-
-            distance += 0.01
-    return save
+def get_maximum_range(angle_radians, result, edges):
+    """
+    Get the range of points along a given angle within image boundaries.
+    """
+    points, lengths, found = get_maximum_ranges(angle_radians, result, edges)
+    return [tuple(point) for point in points[found]]
 
 
 def _get_maximum(start: np.ndarray, end: np.ndarray, edges: np.ndarray, img, angle, is_start: int):
@@ -97,7 +85,7 @@ def _get_maximum(start: np.ndarray, end: np.ndarray, edges: np.ndarray, img, ang
     max1 = find_edge(p1, angle_radians, edges, save=[])
     angle_radians = (np.arctan2(vector[1], vector[0]) + angle) * is_start
     max2 = find_edge(p1, angle_radians, edges, save=[])
-    cv.line(img, max1[0], max2[0], (0, 0, 255), 1)
+    cv.line(img, np.array(max1[0]).astype(int), np.array(max2[0]).astype(int), (0, 0, 255), 1)
     return np.linalg.norm(np.array(max1) - np.array(max2))
 
 
@@ -123,16 +111,15 @@ def get_max_pt(start, end, edges):
     # create an array with 100 points between start and end
     x_values = np.linspace(p1[1], p2[1], 100)
     y_values = np.linspace(p1[0], p2[0], 100)
-    result = [(y, x) for x, y in zip(x_values, y_values)]
-    # set the angle in the direction of the edges
-    angle_radians = vector_angle(vector, 1)
-    r_side = get_maximum_range(angle_radians, result, edges)
-    # set the angle in the direction of other side
-    angle_radians = vector_angle(vector, 0)
-    l_side = get_maximum_range(angle_radians, result, edges)
+    result = np.column_stack((y_values, x_values))
+    # cast the rays in the direction of the edges and in the direction of the other side in one call
+    angles_radians = np.repeat([vector_angle(vector, 1), vector_angle(vector, 0)], len(result))
+    points, lengths, found = get_maximum_ranges(angles_radians, np.concatenate((result, result)), edges)
+    r_side = points[: len(result)][found[: len(result)]]
+    l_side = points[len(result):][found[len(result):]]
     # get the index of the max
     index = get_max_approx(r_side, l_side)
-    return result[index][::-1]
+    return tuple(result[index][::-1])
 
 
 def get_maximum_pit(start: np.ndarray, edges: np.ndarray):
@@ -143,26 +130,22 @@ def get_maximum_pit(start: np.ndarray, edges: np.ndarray):
     point2 = np.array([point[0] + 5, point[1]])
     vector = np.array([point2[0] - point[0], point2[1] - point[1]])
     angle_radians = np.arctan2(vector[1], vector[0])
-    max_save = find_edge(point, angle_radians, edges, save=[])
+    # turn the angle left and right from the start until the norm of the edge found stops growing
     # separate left and right to keep the direction for left and right
-    angle_radians_left = angle_radians
-    angle_radians_right = angle_radians
-    max_save_right = max_save
-    max_save_left = max_save
-
-    while True:
-        angle_radians_left += 0.01
-        max_last_right = find_edge(point, angle_radians_left, edges, save=[])
-        if np.linalg.norm(max_last_right) < np.linalg.norm(max_save_right):
-            break
-        max_save_right = max_last_right
-
-    while True:
-        angle_radians_right -= 0.01
-        max_last_left = find_edge(point, angle_radians_right, edges, save=[])
-        if np.linalg.norm(max_last_left) < np.linalg.norm(max_save_left):
-            break
-        max_save_left = max_last_left
+    plane = kernel_edges(edges)
+    if plane is not None:
+        steps = 0.01 * np.arange(int(np.ceil(2 * np.pi / 0.01)) + 1)
+        stop_left = sweep_kernel(point, angle_radians + steps, plane)
+        stop_right = sweep_kernel(point, angle_radians - steps, plane)
+        max_last_right = find_edge(point, angle_radians + steps[stop_left], plane, save=[])
+        max_save_left = find_edge(point, angle_radians - steps[stop_right - 1], plane, save=[])
+    else:
+        # the rays are cast in growing chunks until the norm of the edge found decreases
+        profile = PolarEdgeProfile(point, edges, angle_radians, 0.01)
+        stop_left = profile.sweep(1)
+        stop_right = profile.sweep(-1)
+        max_last_right = profile.hit(1, stop_left)
+        max_save_left = profile.hit(-1, stop_right - 1)
 
     distance = np.linalg.norm(max(max_save_left, max_last_right))
     point = max(max_save_left, max_last_right)
@@ -1,15 +1,29 @@
 import numpy as np
 import PIL
 from PIL import Image, ImageEnhance
-from rembg import remove
 import cv2 as cv
-from scipy.ndimage import rotate
 import os
-import glob
+from concurrent.futures import ThreadPoolExecutor
 
 from src.utils.crop import _crop
+from src.utils.contour_edges import ContourEdges
+from src.utils.segmentation import segment, REMBG_MODEL
+from src.utils.calibration import undistort_maps, device_name, DEFAULT_DEVICE
 
 RESIZE_SIZE = 900  # the maximum size of the image to be processed (in pixels)
+EDGE_COLOR = 255  # the value of the edge pixels in the single channel (uint8) edges maps
+CHESSBOARD_COARSE_SIZE = 800  # the maximum size of the images where the chessboards are first searched (in pixels)
+EXIF_ORIENTATION = 0x0112  # the EXIF tag of the orientation of the camera
+# the transpose making an image upright for each EXIF orientation (1 is already upright)
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
 
 
 def _resize(im):
@@ -37,6 +51,91 @@ def _resize(im):
 
 
 
+def _open_resized(im_path: str):
+    """Decodes an image directly at the size _resize would give, JPEG images are decoded by libjpeg at a reduced
+    scale (PIL draft) so the full resolution pixels are never decoded.
+
+    Parameters
+    ----------
+    im_path : str
+        The path to the image.
+
+    Returns
+    -------
+    PIL Image
+        The resized RGB image.
+    min_ratio
+        The ratio of the resize (from the full resolution image)
+    """
+    pil_im = PIL.Image.open(im_path)
+    x_im, y_im = pil_im.height, pil_im.width
+    min_ratio = min(RESIZE_SIZE / x_im, RESIZE_SIZE / y_im)
+    if min_ratio >= 1:
+        return pil_im.convert("RGB"), 1
+    size = (int(min_ratio * y_im), int(min_ratio * x_im))
+    # the smallest 1/2, 1/4 or 1/8 scale still larger than size (nothing is done for the other formats)
+    pil_im.draft("RGB", size)
+    return pil_im.convert("RGB").resize(size), min_ratio
+
+
+def _orientation(pil_im, rotation: int):
+    """
+    Return the transpose making a view upright: a quarter turn clockwise if rotation, the EXIF orientation of the
+    image otherwise (None if there is nothing to do)
+    """
+    if rotation:
+        return Image.Transpose.ROTATE_270
+    return EXIF_TRANSPOSE.get(pil_im.getexif().get(EXIF_ORIENTATION))
+
+
+def _orient(image: np.ndarray, transpose):
+    """
+    Apply a transpose given by _orientation to an image as a numpy view (no pixel is copied nor interpolated)
+    """
+    if transpose == Image.Transpose.FLIP_LEFT_RIGHT:
+        return image[:, ::-1]
+    if transpose == Image.Transpose.ROTATE_180:
+        return image[::-1, ::-1]
+    if transpose == Image.Transpose.FLIP_TOP_BOTTOM:
+        return image[::-1]
+    if transpose == Image.Transpose.TRANSPOSE:
+        return image.swapaxes(0, 1)
+    if transpose == Image.Transpose.ROTATE_270:
+        return np.rot90(image, -1)
+    if transpose == Image.Transpose.TRANSVERSE:
+        return image[::-1, ::-1].swapaxes(0, 1)
+    if transpose == Image.Transpose.ROTATE_90:
+        return np.rot90(image)
+    return image
+
+
+class FullResolution:
+    """The full resolution pixels of a view, only decoded (and transformed like the view) when load is called.
+
+    The caller keeps the array only as long as it needs it (get_ratio), so it is released right after.
+    """
+
+    def __init__(self, im_path: str, orientation, calibration: int, luminosity: int = 0, device: str = DEFAULT_DEVICE):
+        self.im_path = im_path
+        self.device = device
+        self.orientation = orientation
+        self.calibration = calibration
+        self.luminosity = luminosity
+
+    def load(self):
+        """
+        Decode the image at full resolution, with the luminosity, the calibration and the orientation of the view
+        (the orientation is a view on the decoded pixels).
+        """
+        pil_im = PIL.Image.open(self.im_path).convert("RGB")
+        if self.luminosity:
+            pil_im = ImageEnhance.Brightness(pil_im).enhance(1.5)
+        image = np.asarray(pil_im)
+        if self.calibration:
+            image = calibrate_image(image, device=self.device)
+        return _orient(image, self.orientation)
+
+
 def canny_edges(im: np.ndarray, image: np.ndarray):
     """ Apply canny to the given image and returns the edges
 
@@ -47,8 +146,8 @@ def canny_edges(im: np.ndarray, image: np.ndarray):
 
     Returns
     -------
-    PIL Image
-        the edges of the image after canny
+    numpy array
+        the edges of the image after canny, single channel uint8 (EDGE_COLOR on the edges)
     """
     grayscale_image = cv.cvtColor(im, cv.COLOR_BGR2GRAY)
 
@@ -59,24 +158,28 @@ def canny_edges(im: np.ndarray, image: np.ndarray):
     dilate = cv.dilate(edged, kernel, iterations=1)
 
     contours, _ = cv.findContours(dilate, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-    edges = np.zeros(image.shape)
+    edges = np.zeros(image.shape[:2], dtype=np.uint8)
     # draw the contours on a copy of the original image
-    cv.drawContours(edges, contours, -1, (0, 255, 0), 2)
+    cv.drawContours(edges, contours, -1, EDGE_COLOR, 2)
     return edges
 
 
-def thresh(im: np.ndarray, image: np.ndarray, line_size):
+def thresh(im: np.ndarray, image: np.ndarray, line_size, backend: str = "raster"):
     """ Apply thresh to the given image and returns the edges
 
     Parameters
     ----------
     im: np.ndarray
     image: np.ndarray
+    line_size: int
+        The thickness of the contours
+    backend: str
+        "raster" for an edges image, "contour" to keep the contours as polylines (ContourEdges)
 
     Returns
     -------
-    PIL Image
-        the edges of the image after thresh
+    numpy array or ContourEdges
+        the edges of the image after thresh, single channel uint8 (EDGE_COLOR on the edges)
     """
 
     grayscale_image = cv.cvtColor(im, cv.COLOR_BGR2GRAY)
@@ -84,49 +187,43 @@ def thresh(im: np.ndarray, image: np.ndarray, line_size):
 
     # find the contours in the grayscaled image
     contours, _ = cv.findContours(binary_silhouette, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-    edges = np.zeros(image.shape)
-    # draw the contours on a copy of the original image
-    cv.drawContours(edges, contours, -1, (0, 255, 0), line_size)
     cv.drawContours(image, contours, -1, (0, 255, 0), line_size)
+    if backend == "contour":
+        return ContourEdges(contours, image.shape, line_size)
+    edges = np.zeros(image.shape[:2], dtype=np.uint8)
+    # draw the contours on a copy of the original image
+    cv.drawContours(edges, contours, -1, EDGE_COLOR, line_size)
     return edges
 
 
-def calibrate_image(im):
-    chessboard_size = (5, 5)  # Change this to match your pattern
-    if not os.path.exists("camera_calibration.npz"):
-        chessboard_imgs = glob.glob('img/chessboard/*.jpg')
-        if (len(chessboard_imgs) == 0):
-            print("You need a chessboards folder with images with chessboard in it")
-        criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-        obj_points = []
-        img_points = []
-
-        objp = np.zeros((chessboard_size[0] * chessboard_size[1], 3), np.float32)
-        objp[:, :2] = np.mgrid[0:chessboard_size[0], 0:chessboard_size[1]].T.reshape(-1, 2)
-        for fname in chessboard_imgs:
-            pil_im = PIL.Image.open(fname).convert('RGB')
-            pil_im, min_ratio = _resize(pil_im)
-            img = np.asarray(pil_im)
-            gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
-            ret, corners = cv.findChessboardCorners(gray, chessboard_size, None)
-            if ret:
-                obj_points.append(objp)
-                corners2 = cv.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
-                img_points.append(corners2 / min_ratio)
-            else:
-                print("one not found")
-
-        ret, mtx, dist, rvecs, tvecs = cv.calibrateCamera(obj_points, img_points, gray.shape[::-1], None, None)
-        np.savez('camera_calibration.npz', mtx=mtx, dist=dist, rvecs=rvecs, tvecs=tvecs)
-    else:
-        calibration_data = np.load('camera_calibration.npz')
-        mtx, dist, rvecs, tvecs = calibration_data['mtx'], calibration_data['dist'], calibration_data['rvecs'], calibration_data['tvecs']
-    h, w = im.shape[:2]
-    newcameramtx, roi = cv.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
-    undist = cv.undistort(im, mtx, dist, None, newcameramtx)
-    return undist
+def calibrate_image(im, scale: float = 1, device: str = DEFAULT_DEVICE):
+    """
+    Undistort an image taken by a device with the maps of the calibration store, scale is the ratio between its
+    size and the size of the full resolution images
+    """
+    map1, map2 = undistort_maps(device, im.shape[1::-1], scale)
+    return cv.remap(im, map1, map2, cv.INTER_LINEAR)
+
+def load_plate(im_path: str, calibration: int, rotation: int):
+    """
+    Load the photo of the empty rig (background plate) like the views are loaded before their background is removed
+    Parameters
+    ----------
+    im_path: str
+    calibration : int
+    rotation : int
+
+    Returns
+    -------
+    numpy array
+    """
+    pil_im, min_ratio = _open_resized(im_path)
+    image = np.array(pil_im)
+    if calibration:
+        image = calibrate_image(image, min_ratio, device_name(pil_im))
+    return np.ascontiguousarray(_orient(image, _orientation(pil_im, rotation)))
 
-def create_resize_remove_im_front(im_path: str, calibration: int, rotation: int, luminosity):
+def create_resize_remove_im_front(im_path: str, calibration: int, rotation: int, luminosity, rembg_model: str = REMBG_MODEL, plate: np.ndarray = None):
     """
     Take and image path and return image without background, resized and the pil version
     Parameters
@@ -134,37 +231,45 @@ def create_resize_remove_im_front(im_path: str, calibration: int, rotation: int,
     calibration : int
     rotation : int
     im_path: str
+    rembg_model: str
+        The rembg model removing the background
+    plate: np.ndarray
+        The background plate given by load_plate (None to use rembg)
 
     Returns
     -------
     PIL Image
+        the image given to the pose network
+    numpy array
+        the resized image
+    numpy array
+        the resized image without background
+    FullResolution
+        the full resolution image, decoded by its load method
+    float
+        the ratio of the resize
     """
-    pil_im = PIL.Image.open(im_path).convert("RGB")
+    pil_im, min_ratio = _open_resized(im_path)
+    orientation = _orientation(pil_im, rotation)
+    # read from the EXIF before the luminosity change (the enhanced image has no EXIF)
+    device = device_name(pil_im)
     if luminosity:
         img_enhancer = ImageEnhance.Brightness(pil_im)
         factor = 1.5
         pil_im = img_enhancer.enhance(factor)
-    original_image = np.asarray(pil_im)
-    pil_im, min_ratio = _resize(pil_im)
-    image_resized = np.asarray(pil_im)
-    im = remove(image_resized)
-    if rotation:
-        im = rotate(im, -90, reshape=True, mode='nearest')
-        image_resized = rotate(image_resized, -90, reshape=True, mode='nearest')
-        original_image = rotate(original_image, -90, reshape=True, mode='nearest')
+    # the full resolution image is only decoded when get_ratio needs it
+    original_image = FullResolution(im_path, orientation, calibration, luminosity, device)
+    image_resized = np.array(pil_im)
     if calibration:
-        original_image = calibrate_image(original_image)
-        original_pil_image = Image.fromarray(original_image)
-        original_pil_image.save("t.jpg")
-        image_resized, min_ratio2 = _resize(original_pil_image)
-        image_resized = np.asarray(image_resized)
-        im = remove(image_resized)
-        pil_im = Image.fromarray(image_resized)
-    else:
-        pil_im = pil_im.transpose(Image.ROTATE_270)
+        # undistorted at the working resolution, in the frame of the camera (before the orientation)
+        image_resized = calibrate_image(image_resized, min_ratio, device)
+    # the working image is drawn on so it is made contiguous, every later image is computed in this orientation
+    image_resized = np.ascontiguousarray(_orient(image_resized, orientation))
+    pil_im = Image.fromarray(image_resized)
+    im = segment(image_resized, rembg_model, plate)
     return pil_im, image_resized, im, original_image, min_ratio
 
-def create_resize_remove_im(im_path: str, calibration: int, rotation: int):
+def create_resize_remove_im(im_path: str, calibration: int, rotation: int, rembg_model: str = REMBG_MODEL, plate: np.ndarray = None):
     """
     Take and image path and return image without background, resized and the pil version
     Parameters
@@ -172,30 +277,37 @@ def create_resize_remove_im(im_path: str, calibration: int, rotation: int):
     calibration : int
     rotation : int
     im_path: str
+    rembg_model: str
+        The rembg model removing the background
+    plate: np.ndarray
+        The background plate given by load_plate (None to use rembg)
 
     Returns
     -------
     PIL Image
+        the image given to the pose network
+    numpy array
+        the resized image
+    numpy array
+        the resized image without background
+    FullResolution
+        the full resolution image, decoded by its load method
+    float
+        the ratio of the resize
     """
-    pil_im = PIL.Image.open(im_path).convert("RGB")
-    original_image = np.asarray(pil_im)
-    pil_im, min_ratio = _resize(pil_im)
-    image_resized = np.asarray(pil_im)
-    im = remove(image_resized)
-    if rotation:
-        im = rotate(im, -90, reshape=True, mode='nearest')
-        image_resized = rotate(image_resized, -90, reshape=True, mode='nearest')
-        original_image = rotate(original_image, -90, reshape=True, mode='nearest')
+    pil_im, min_ratio = _open_resized(im_path)
+    orientation = _orientation(pil_im, rotation)
+    # the full resolution image is only decoded when get_ratio needs it
+    device = device_name(pil_im)
+    original_image = FullResolution(im_path, orientation, calibration, device=device)
+    image_resized = np.array(pil_im)
     if calibration:
-        original_image = calibrate_image(original_image)
-        original_pil_image = Image.fromarray(original_image)
-        original_pil_image.save("t.jpg")
-        image_resized, min_ratio2 = _resize(original_pil_image)
-        image_resized = np.asarray(image_resized)
-        im = remove(image_resized)
-        pil_im = Image.fromarray(image_resized)
-    else:
-        pil_im = pil_im.transpose(Image.ROTATE_270)
+        # undistorted at the working resolution, in the frame of the camera (before the orientation)
+        image_resized = calibrate_image(image_resized, min_ratio, device)
+    # the working image is drawn on so it is made contiguous, every later image is computed in this orientation
+    image_resized = np.ascontiguousarray(_orient(image_resized, orientation))
+    pil_im = Image.fromarray(image_resized)
+    im = segment(image_resized, rembg_model, plate)
     return pil_im, image_resized, im, original_image, min_ratio
 
 
@@ -208,59 +320,117 @@ def better_edges(edges: np.ndarray, data: np.ndarray):
     crotch_approx = np.array(
         [round(data[12][0] + height[0]), round(data[12][1] + height[1] - 5)]
     )
-    cv.line(edges, crotch, crotch_approx, (0, 255, 0), 7)
+    if isinstance(edges, ContourEdges):
+        edges.add_line(crotch, crotch_approx, 7)
+    else:
+        cv.line(edges, crotch, crotch_approx, EDGE_COLOR, 7)
     return edges
 
 
-def get_ratio(img: np.ndarray, min_ratio):
+def _find_chessboard(image: np.ndarray, pattern_size: tuple):
+    """Find the corners of a chessboard from coarse to fine: the pattern is searched on the image downsampled to
+    CHESSBOARD_COARSE_SIZE (on the full image if it is not found there), then the corners are refined with
+    cornerSubPix in a small full resolution region around the chessboard.
+
+    Parameters
+    ----------
+    image : numpy array
+        The image with one chessboard.
+    pattern_size : tuple
+        The number of inner corners of the chessboard.
+
+    Returns
+    -------
+    numpy array
+        The refined corners (same format as cv.cornerSubPix), None if the chessboard is not found.
     """
-    Take an image with 4 chessboards, find the chessboards inside the image and calculate the center of each chessboard
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.00001)
+    scale = min(1.0, CHESSBOARD_COARSE_SIZE / max(image.shape[:2]))
+    ret = False
+    if scale < 1:
+        small = cv.resize(image, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        ret, corners = cv.findChessboardCorners(small, pattern_size, None)
+        if ret:
+            # from the pixel centers of the small image to the ones of the full image
+            corners = (corners + 0.5) / scale - 0.5
+    if not ret:
+        ret, corners = cv.findChessboardCorners(image, pattern_size, None)
+        if not ret:
+            return None
+    # the region covers the cornerSubPix windows around the corners, with the error of the coarse corners
+    margin = int(np.ceil(2 / scale)) + 2 * max(pattern_size) + 2
+    x_min, y_min = np.maximum(np.floor(corners.reshape(-1, 2).min(axis=0)).astype(int) - margin, 0)
+    x_max, y_max = np.ceil(corners.reshape(-1, 2).max(axis=0)).astype(int) + margin + 1
+    gray = cv.cvtColor(np.ascontiguousarray(image[y_min:y_max, x_min:x_max]), cv.COLOR_BGR2GRAY)
+    offset = np.array([x_min, y_min], dtype=np.float32)
+    corners2 = cv.cornerSubPix(gray, (corners - offset).astype(np.float32), pattern_size, (-1, -1), criteria)
+    return corners2 + offset
+
+
+def find_chessboards(img: np.ndarray):
+    """
+    Find the contour of the 4 chessboards of the rig, each one is searched in its part of the image (in parallel,
+    OpenCV releases the GIL)
 
     Parameters
     ----------
     img : numpy array
         The image with chessboards
-    min_ratio : float
-        The ratio used to resize the image
     Returns
     -------
-    the distance from the chessboard adjusted with the resized image
+    list
+        the 4 corners of each chessboard contour in the image (None if it is not found), in the order used by get_ratio
     """
     pattern_size = (5, 5)
     img1 = _crop(img, [0, 0], [img.shape[1] / 2, img.shape[0] / 2])
     img2 = _crop(img, [img.shape[1] / 2, img.shape[0] / 2], [img.shape[1], 0])
     img3 = _crop(img, [img.shape[1] / 2, img.shape[0] / 2], [img.shape[1], img.shape[0] / 1.3])
     img4 = _crop(img, [0, img.shape[0] / 2], [img.shape[1] / 2, img.shape[0]])
+    offsets = [[0, 0], [img.shape[1] / 2, 0], [img.shape[1] / 2, img.shape[0] / 2], [0, img.shape[0] / 2]]
 
-    imgs = []
-    imgs.append(img1)
-    imgs.append(img2)
-    imgs.append(img3)
-    imgs.append(img4)
-    chess_points = []
-    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.00001)
-
-    for image in imgs:
-        gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    with ThreadPoolExecutor(4) as executor:
+        all_corners = list(executor.map(lambda image: _find_chessboard(image, pattern_size), [img1, img2, img3, img4]))
 
-        # Find the chessboard corners
-        ret, corners = cv.findChessboardCorners(image, pattern_size, None)
-        if ret:  # Check if corners were found
-            corners2 = cv.cornerSubPix(gray, corners, pattern_size, (-1, -1), criteria)
+    contours = []
+    for corners2, offset in zip(all_corners, offsets):
+        if corners2 is not None:  # Check if corners were found
             # Get the contour of the chessboard pattern
             hull = cv.convexHull(corners2)
             epsilon = 0.02 * cv.arcLength(hull, True)
             corners_hull = cv.approxPolyDP(hull, epsilon, True)
-            chessboard_contour = corners_hull[:4, 0, :]
-            chess_points.append(np.mean(chessboard_contour, axis=0))
-            cv.drawContours(image, [chessboard_contour.astype(int)], -1, (255, 0, 0), 1)
+            contours.append(corners_hull[:4, 0, :] + offset)
         else:
             print("Chessboard corners not found")
-    chess_points[1] = chess_points[1] + [img.shape[1] / 2, 0]
-    chess_points[2] = chess_points[2] + [img.shape[1] / 2, img.shape[0] / 2]
-    chess_points[3] = chess_points[3] + [0, img.shape[0] / 2]
+            contours.append(None)
+    return contours
+
+
+def chessboard_ratios(contours: list):
+    """
+    Return the distances between the centers of the top chessboards and of the bottom ones (in pixels of the image
+    given to find_chessboards)
+    """
+    chess_points = [np.mean(contour, axis=0) for contour in contours if contour is not None]
     ratio = np.linalg.norm(chess_points[0] - chess_points[1])
     ratio2 = np.linalg.norm(chess_points[2] - chess_points[3])
+    return ratio, ratio2
+
+
+def get_ratio(img: np.ndarray, min_ratio):
+    """
+    Take an image with 4 chessboards, find the chessboards inside the image and calculate the center of each chessboard
+
+    Parameters
+    ----------
+    img : numpy array
+        The image with chessboards
+    min_ratio : float
+        The ratio used to resize the image
+    Returns
+    -------
+    the distance from the chessboard adjusted with the resized image
+    """
+    ratio, ratio2 = chessboard_ratios(find_chessboards(img))
     return ratio * min_ratio, ratio2 * min_ratio
 
 
@@ -304,7 +474,7 @@ def get_ratio_meas_bottom(knee, ankle):
     return 41 / np.linalg.norm(knee - ankle), 41 / np.linalg.norm(knee - ankle)
 
 
-def save_img(image, image_r_side, image_tuck, image_r_tuck, image_pike, name):
+def save_img(image, image_r_side, image_tuck, image_r_tuck, image_pike, name, output_dir=""):
     """
     Take the 5 image modified by the keypoints and save them in a folder
     Parameters
@@ -321,20 +491,22 @@ def save_img(image, image_r_side, image_tuck, image_r_tuck, image_pike, name):
         Pike image
     name : string
         Name of the person inside the image
+    output_dir : string
+        Folder of the outputs of the person (the current folder by default)
 
     Returns
     -------
 
     """
-    if not os.path.exists(f"{name}_dir"):
-        os.mkdir(f"{name}_dir")
+    folder = os.path.join(output_dir, f"{name}_dir")
+    os.makedirs(folder, exist_ok=True)
     img = Image.fromarray(image)
-    img.save(f"{name}_dir/{name}_front_t.jpg")
+    img.save(f"{folder}/{name}_front_t.jpg")
     img = Image.fromarray(image_r_side)
-    img.save(f"{name}_dir/{name}_side.jpg")
+    img.save(f"{folder}/{name}_side.jpg")
     img = Image.fromarray(image_tuck)
-    img.save(f"{name}_dir/{name}_tuck.jpg")
+    img.save(f"{folder}/{name}_tuck.jpg")
     img = Image.fromarray(image_r_tuck)
-    img.save(f"{name}_dir/{name}_r_tuck_t.jpg")
+    img.save(f"{folder}/{name}_r_tuck_t.jpg")
     img = Image.fromarray(image_pike)
-    img.save(f"{name}_dir/{name}_pike_t.jpg")
+    img.save(f"{folder}/{name}_pike_t.jpg")
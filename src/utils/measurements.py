@@ -0,0 +1,334 @@
+import numpy as np
+
+from src.utils.get_maximum import max_perp, max_line, get_length
+from src.utils.perimeter_calculator import stad_p, circle_p
+
+# The measurements are expressions built from geometric primitives measured in pixels on one view:
+# (operation, view, start landmark, end landmark). The views are "front", "side", "tuck", "r_tuck" and "pike",
+# the scale factors are the names of the ratios of YeadonModel (or numbers).
+PRIMITIVES = ("max_perp", "max_line", "length", "distance", "height")
+
+
+def perp(view: str, start: str, end: str):
+    """Maximum perpendicular distance between two edges (max_perp)."""
+    return "max_perp", view, start, end
+
+
+def line(view: str, start: str, end: str):
+    """Maximum distance between two edges along the line (max_line)."""
+    return "max_line", view, start, end
+
+
+def length(view: str, start: str, end: str):
+    """Distance between two landmarks, drawn on the image of the view (get_length)."""
+    return "length", view, start, end
+
+
+def distance(view: str, start: str, end: str):
+    """Distance between two landmarks."""
+    return "distance", view, start, end
+
+
+def height(view: str, start: str, end: str):
+    """Vertical distance between two landmarks."""
+    return "height", view, start, end
+
+
+def scale(node, factor):
+    """Multiply by a ratio (given by its name) or a number."""
+    return "scale", node, factor
+
+
+def divide(node, value: float):
+    """Divide by a number."""
+    return "divide", node, value
+
+
+def stadium(width, depth):
+    """Perimeter of a stadium (stad_p)."""
+    return "stad_p", width, depth
+
+
+def circle(diag):
+    """Perimeter of a circle (circle_p)."""
+    return "circle_p", diag
+
+
+def smallest(*nodes):
+    return ("min",) + nodes
+
+
+def largest(*nodes):
+    return ("max",) + nodes
+
+
+def ref(name: str):
+    """The value of another measurement."""
+    return "ref", name
+
+
+_crotch_width = smallest(
+    scale(perp("front", "left_crotch", "left_knee"), "ratio_bottom"),
+    scale(perp("front", "right_crotch", "right_knee"), "ratio_bottom"),
+)
+_tuck_mid_arm = scale(perp("tuck", "left_mid_arm", "left_elbow"), "ratio_tuck")
+_left_wrist_width = perp("front", "left_wrist", "left_elbow")
+_right_wrist_width = perp("front", "right_wrist", "right_elbow")
+_left_nails_width = perp("front", "left_nails", "left_wrist")
+_right_nails_width = perp("front", "right_nails", "right_wrist")
+_left_knuckles_width = perp("front", "left_knuckles", "left_wrist")
+_right_knuckles_width = perp("front", "right_knuckles", "right_wrist")
+
+# The measurements of Yeadon's model, in the order of the .txt file
+YEADON_MEASUREMENTS = {
+    "Ls1L": scale(length("front", "umbiculus", "hip"), "ratio2"),
+    "Ls2L": scale(length("front", "lowest_front_rib", "hip"), "ratio2"),
+    "Ls3L": scale(length("front", "nipple", "hip"), "ratio2"),
+    "Ls4L": scale(length("front", "shoulder", "hip"), "ratio2"),
+    "Ls5L": scale(length("front", "acromion", "hip"), "ratio2"),
+    "Ls6L": scale(length("front", "acromion", "nose_height"), "ratio2"),
+    "Ls7L": scale(length("front", "acromion", "ear"), "ratio2"),
+    "Ls8L": scale(height("front", "left_acromion_height", "top_of_head"), "ratio2"),
+
+    "Ls0p": stadium(scale(line("front", "right_hip", "left_hip"), "ratio"),
+                    scale(perp("side", "right_hip", "right_knee"), "ratio_r_side")),
+    "Ls1p": stadium(scale(line("front", "left_umbiculus", "right_umbiculus"), "ratio"),
+                    scale(perp("side", "right_umbiculus", "right_knee"), "ratio_r_side")),
+    "Ls2p": stadium(scale(largest(line("front", "right_lowest_front_rib", "left_lowest_front_rib"),
+                                  distance("front", "right_lowest_front_rib", "left_lowest_front_rib")), "ratio"),
+                    scale(perp("side", "right_lowest_front_rib", "right_hip"), "ratio_r_side")),
+    "Ls3p": stadium(scale(line("front", "right_nipple", "left_nipple"), "ratio"),
+                    scale(line("side", "right_nipple_pit_2", "right_nipple_pit_5"), "ratio_r_side")),
+    "Ls5p": circle(scale(length("front", "left_acromion", "right_acromion"), "ratio")),
+    "Ls6p": stadium(scale(length("front", "nose_right", "nose_left"), "ratio"),
+                    scale(line("side", "nose_up", "below_ear"), "ratio_r_side")),
+    "Ls7p": stadium(scale(length("front", "left_ear", "right_ear"), "ratio"),
+                    scale(line("side", "right_ear", "right_eye"), "ratio_r_side")),
+
+    "Ls0w": scale(line("front", "left_hip", "right_hip"), "ratio"),
+    "Ls1w": largest(scale(line("front", "left_umbiculus", "right_umbiculus"), "ratio"),
+                    scale(distance("front", "left_umbiculus", "right_umbiculus"), "ratio")),
+    "Ls2w": largest(scale(line("front", "left_lowest_front_rib", "right_lowest_front_rib"), "ratio"),
+                    scale(distance("front", "left_lowest_front_rib", "right_lowest_front_rib"), "ratio")),
+    "Ls3w": largest(scale(line("front", "left_nipple", "right_nipple"), "ratio"),
+                    scale(distance("front", "left_nipple", "right_nipple"), "ratio")),
+    "Ls4w": scale(length("front", "left_shoulder", "right_shoulder"), "ratio"),
+
+    "Ls4d": scale(perp("side", "right_shoulder", "right_elbow"), "ratio_r_side"),
+
+    "La2L": scale(length("front", "left_shoulder", "left_elbow"), "ratio"),
+    "La3L": scale(length("front", "left_shoulder", "left_maximum_forearm"), "ratio"),
+    "La4L": scale(length("front", "left_shoulder", "left_wrist"), "ratio"),
+    "La5L": scale(length("front", "left_wrist", "left_base_of_thumb"), "ratio"),
+    "La6L": scale(length("front", "left_wrist", "left_knuckles"), "ratio"),
+    "La7L": scale(length("front", "left_wrist", "left_nails"), "ratio"),
+
+    "La0p": scale(circle(perp("front", "left_shoulder_perimeter_width", "left_shoulder")), "ratio2"),
+    "La1p": circle(smallest(_tuck_mid_arm, scale(perp("front", "left_mid_arm", "left_elbow"), "ratio"))),
+    "La2p": scale(circle(perp("front", "left_elbow", "left_mid_arm")), "ratio2"),
+    "La3p": scale(circle(perp("front", "left_maximum_forearm", "left_elbow")), "ratio2"),
+    "La4p": scale(stadium(_left_wrist_width, divide(_left_wrist_width, 2)), "ratio2"),
+    "La5p": stadium(scale(perp("front", "left_base_of_thumb", "left_base_of_thumb_next"), "ratio2"), 0),
+    "La6p": scale(stadium(_left_knuckles_width, divide(_left_knuckles_width, 3)), "ratio2"),
+    "La7p": scale(stadium(_left_nails_width, divide(_left_nails_width, 3)), "ratio2"),
+
+    "La4w": scale(_left_wrist_width, "ratio2"),
+    "La5w": scale(perp("front", "left_base_of_thumb", "left_base_of_thumb_next"), "ratio2"),
+    "La6w": scale(_left_knuckles_width, "ratio2"),
+    "La7w": scale(_left_nails_width, "ratio2"),
+
+    "Lb2L": scale(length("front", "right_shoulder", "right_elbow"), "ratio"),
+    "Lb3L": scale(length("front", "right_shoulder", "right_maximum_forearm"), "ratio"),
+    "Lb4L": scale(length("front", "right_shoulder", "right_wrist"), "ratio"),
+    "Lb5L": scale(length("front", "right_wrist", "right_base_of_thumb"), "ratio"),
+    "Lb6L": scale(length("front", "right_wrist", "right_knuckles"), "ratio"),
+    "Lb7L": scale(length("front", "right_wrist", "right_nails"), "ratio"),
+
+    "Lb0p": scale(circle(perp("front", "right_shoulder_perimeter_width", "right_shoulder")), "ratio2"),
+    "Lb1p": circle(smallest(_tuck_mid_arm, scale(perp("front", "right_mid_arm", "right_elbow"), "ratio"))),
+    "Lb2p": scale(circle(perp("front", "right_elbow", "right_mid_arm")), "ratio2"),
+    "Lb3p": scale(circle(perp("front", "right_maximum_forearm", "right_elbow")), "ratio2"),
+    "Lb4p": scale(stadium(_right_wrist_width, divide(_right_wrist_width, 2)), "ratio2"),
+    "Lb5p": stadium(scale(perp("front", "right_base_of_thumb", "right_base_of_thumb_next"), "ratio2"), 0),
+    "Lb6p": scale(stadium(_right_knuckles_width, divide(_right_knuckles_width, 3)), "ratio2"),
+    "Lb7p": scale(stadium(_left_nails_width, divide(_right_nails_width, 4)), "ratio2"),
+
+    "Lb4w": scale(_right_wrist_width, "ratio2"),
+    "Lb5w": scale(perp("front", "right_base_of_thumb", "right_base_of_thumb_next"), "ratio2"),
+    "Lb6w": scale(_right_knuckles_width, "ratio2"),
+    "Lb7w": scale(_right_nails_width, "ratio2"),
+
+    "Lj1L": scale(distance("front", "left_hip", "left_crotch"), "ratio_bottom"),
+    "Lj3L": scale(distance("front", "left_hip", "left_knee"), "ratio_bottom"),
+    "Lj4L": scale(distance("front", "left_hip", "left_maximum_calf"), "ratio_bottom"),
+    "Lj5L": scale(distance("side", "right_hip", "right_ankle"), "ratio_r_side"),
+    "Lj6L": 1.0,
+    "Lj8L": scale(distance("tuck", "right_ankle", "right_ball"), "ratio_tuck2"),
+    "Lj9L": scale(distance("tuck", "right_ankle", "right_toe_nail"), "ratio_tuck2"),
+
+    "Lj1p": circle(_crotch_width),
+    "Lj2p": scale(circle(perp("front", "right_mid_thigh", "right_hip")), "ratio_bottom"),
+    "Lj3p": scale(circle(perp("front", "right_knee", "right_hip")), "ratio_bottom"),
+    "Lj4p": scale(circle(perp("front", "right_maximum_calf", "right_knee")), "ratio_bottom"),
+    "Lj5p": scale(circle(perp("tuck", "right_ankle", "right_knee")), "ratio_tuck"),
+    "Lj6p": stadium(scale(perp("r_tuck", "right_ankle", "right_toe_nail"), "ratio_r_tuck"),
+                    scale(perp("tuck", "right_ankle", "right_toe_nail"), "ratio_tuck")),
+    "Lj7p": stadium(scale(perp("tuck", "right_arch", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_arch", "right_ankle"), "ratio_r_tuck")),
+    "Lj8p": stadium(scale(perp("tuck", "right_ball", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_ball", "right_ankle"), "ratio_r_tuck")),
+    "Lj9p": stadium(scale(perp("tuck", "right_toe_nail", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_ball", "right_ankle"), "ratio_r_tuck")),
+
+    "Lj8w": scale(perp("tuck", "right_ball", "right_ankle"), "ratio_tuck"),
+    "Lj9w": scale(perp("tuck", "right_toe_nail", "right_ankle"), "ratio_tuck"),
+
+    "Lj6d": scale(perp("r_tuck", "right_ankle", "right_knee"), "ratio_r_tuck"),
+
+    "Lk1L": scale(length("front", "right_hip", "right_crotch"), "ratio_bottom"),
+    "Lk3L": scale(length("front", "right_hip", "right_knee"), "ratio_bottom"),
+    "Lk4L": scale(length("front", "right_hip", "right_maximum_calf"), "ratio_bottom"),
+    "Lk5L": scale(length("side", "right_hip", "right_ankle"), "ratio_r_side"),
+    "Lk6L": 1.0,
+    "Lk8L": scale(length("tuck", "right_ankle", "right_ball"), "ratio_tuck2"),
+    "Lk9L": scale(length("tuck", "right_ankle", "right_toe_nail"), "ratio_tuck2"),
+
+    "Lk1p": circle(_crotch_width),
+    "Lk2p": scale(circle(perp("front", "right_mid_thigh", "right_hip")), "ratio_bottom"),
+    "Lk3p": scale(circle(perp("front", "right_knee", "right_hip")), "ratio_bottom"),
+    "Lk4p": scale(circle(perp("front", "right_maximum_calf", "right_knee")), "ratio_bottom"),
+    "Lk5p": scale(circle(perp("tuck", "right_ankle", "right_knee")), "ratio_tuck"),
+    "Lk6p": stadium(scale(perp("r_tuck", "right_ankle", "right_toe_nail"), "ratio_r_tuck"),
+                    scale(perp("tuck", "right_ankle", "right_toe_nail"), "ratio_tuck")),
+    "Lk7p": stadium(scale(perp("tuck", "right_arch", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_arch", "right_ankle"), "ratio_r_tuck")),
+    "Lk8p": stadium(scale(perp("tuck", "right_ball", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_ball", "right_ankle"), "ratio_r_tuck")),
+    "Lk9p": stadium(scale(perp("tuck", "right_toe_nail", "right_ankle"), "ratio_tuck"),
+                    scale(perp("r_tuck", "right_ball", "right_ankle"), "ratio_r_tuck")),
+
+    "Lk8w": scale(perp("tuck", "right_ball", "right_ankle"), "ratio_tuck"),
+    "Lk9w": scale(perp("tuck", "right_toe_nail", "right_ankle"), "ratio_tuck"),
+
+    "Lk6d": scale(perp("r_tuck", "right_ankle", "right_knee"), "ratio_r_tuck"),
+}
+
+# The primitives measured only to draw them on the images like before (not written in the .txt file)
+DRAWN_MEASUREMENTS = {
+    "tuck_left_wrist_width": perp("tuck", "left_wrist", "left_elbow"),
+}
+
+# The markers of the acrobatic model (in meters), see generate_yml
+ACROBATIC_MARKERS = {
+    "pelvis": divide(scale(height("front", "left_hip", "top_of_head"), "ratio"), 100),
+    "knuckle": divide(ref("Lb6L"), 100),
+    "pike_hand": divide(scale(length("pike", "right_knee", "right_hand"), "ratio_pike"), 100),
+    "tuck_hand": divide(scale(length("r_tuck", "right_knee", "right_knee_at_knuckle"), "ratio_r_tuck"), 100),
+}
+
+
+class MeasurementGraph:
+    """Evaluate measurements defined as expressions of geometric primitives.
+
+    The expressions of the requested measurements are compiled into the set of primitives they depend on,
+    each unique primitive is measured once and shared by every measurement using it, and only the requested
+    measurements (and the ones they refer to) are evaluated.
+
+    Attributes
+    ----------
+    primitives : dict
+        The primitives measured so far, by (operation, view, start, end).
+    """
+
+    def __init__(self, views: dict, ratios: dict, table: dict = None, primitives: dict = None):
+        """
+        Parameters
+        ----------
+        views : dict
+            (landmarks, edges, image) by view name.
+        ratios : dict
+            The value of every scale factor by name.
+        table : dict
+            The expressions by measurement name (YEADON_MEASUREMENTS, ACROBATIC_MARKERS and DRAWN_MEASUREMENTS by
+            default).
+        primitives : dict
+            The primitives already measured (by (operation, view, start, end)), they are not measured again.
+        """
+        self.views = views
+        self.ratios = ratios
+        self.table = table if table is not None else {**YEADON_MEASUREMENTS, **ACROBATIC_MARKERS, **DRAWN_MEASUREMENTS}
+        self.primitives = primitives if primitives is not None else {}
+        self._values = {}
+
+    def dependencies(self, names):
+        """
+        Return the unique primitives needed to evaluate the given measurements.
+        """
+        primitives, seen = [], set()
+        nodes = [self.table[name] for name in names]
+        while nodes:
+            node = nodes.pop()
+            if not isinstance(node, tuple):
+                continue
+            if node[0] in PRIMITIVES:
+                if node not in seen:
+                    seen.add(node)
+                    primitives.append(node)
+            elif node[0] == "ref":
+                nodes.append(self.table[node[1]])
+            else:
+                nodes.extend(node[1:])
+        return primitives
+
+    def _measure(self, primitive: tuple):
+        operation, view, start, end = primitive
+        landmarks, edges, image = self.views[view]
+        if operation == "max_perp":
+            return max_perp(landmarks[start], landmarks[end], edges, image)
+        if operation == "max_line":
+            return max_line(landmarks[start], landmarks[end], edges, image)
+        if operation == "length":
+            return get_length(landmarks[start], landmarks[end], image)
+        if operation == "distance":
+            return np.linalg.norm(landmarks[start] - landmarks[end])
+        return abs(landmarks[start][1] - landmarks[end][1])
+
+    def _evaluate(self, node):
+        if not isinstance(node, tuple):
+            return node
+        operation = node[0]
+        if operation in PRIMITIVES:
+            return self.primitives[node]
+        if operation == "ref":
+            return self.value(node[1])
+        values = [self._evaluate(child) for child in node[1:]]
+        if operation == "scale":
+            factor = node[2]
+            return values[0] * (self.ratios[factor] if isinstance(factor, str) else factor)
+        if operation == "divide":
+            return values[0] / values[1]
+        if operation == "stad_p":
+            return stad_p(*values)
+        if operation == "circle_p":
+            return circle_p(*values)
+        if operation == "min":
+            return min(values)
+        return max(values)
+
+    def value(self, name: str):
+        """
+        Return the value of one measurement (evaluated once).
+        """
+        if name not in self._values:
+            self._values[name] = self._evaluate(self.table[name])
+        return self._values[name]
+
+    def evaluate(self, names=None):
+        """
+        Measure the primitives needed by the given measurements (all of them by default) and return their values.
+        """
+        names = list(self.table) if names is None else list(names)
+        for primitive in self.dependencies(names):
+            if primitive not in self.primitives:
+                self.primitives[primitive] = self._measure(primitive)
+        return {name: self.value(name) for name in names}
@@ -0,0 +1,241 @@
+import os
+import glob
+import time
+import queue
+import argparse
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+from src.utils.cache import load_arrays, store_arrays
+
+CHECKPOINT = "shufflenetv2k30-wholebody"
+# torch runs the checkpoint, onnx runs it exported with ONNX Runtime (onnx-int8 with the weights quantized)
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# the key points read by YeadonModel
+KEYPOINTS = np.arange(126)
+# the default pool configuration, can be changed with these environment variables (used by the server)
+POOL_SIZE = int(os.environ.get("IM2MEAS_PREDICTORS", 1))
+TORCH_THREADS = int(os.environ.get("IM2MEAS_TORCH_THREADS", 0))
+POSE_BACKEND = os.environ.get("IM2MEAS_POSE_BACKEND", "torch")
+
+_pool = None
+_pool_lock = threading.Lock()
+# the configuration of the pool, set by configure_predictor_pool before it is loaded
+_pool_options = {"size": POOL_SIZE, "torch_threads": TORCH_THREADS, "backend": POSE_BACKEND}
+
+
+def load_predictor(checkpoint: str = CHECKPOINT, backend: str = "torch", threads: int = 0):
+    """
+    Load an openpifpaf.Predictor of the checkpoint with its network run by the given backend (see BACKENDS).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown pose backend {backend}, choose from {BACKENDS}")
+    # openpifpaf and torch take seconds to import, they are only imported when a network is loaded
+    if backend == "torch":
+        import openpifpaf
+
+        return openpifpaf.Predictor(checkpoint=checkpoint)
+    from src.utils.pose_onnx import onnx_predictor
+
+    return onnx_predictor(checkpoint, quantize=backend == "onnx-int8", threads=threads)
+
+
+class PredictorPool:
+    """A pool of loaded openpifpaf predictors shared by every YeadonModel of the process.
+
+    Each predictor is used by one request at a time, so the size of the pool is the number of images that
+    can go through the network concurrently.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        checkpoint: str = CHECKPOINT,
+        torch_threads: int = TORCH_THREADS,
+        backend: str = POSE_BACKEND,
+    ):
+        """
+        Parameters
+        ----------
+        size : int
+            The number of predictors loaded.
+        checkpoint : str
+            The openpifpaf checkpoint.
+        torch_threads : int
+            The number of threads used by the network inside an operation (0 to keep the default).
+        backend : str
+            The backend running the network, see BACKENDS.
+        """
+        if torch_threads > 0:
+            import torch
+
+            torch.set_num_threads(torch_threads)
+        self.size = size
+        self.checkpoint = checkpoint
+        self.backend = backend
+        self._predictors = queue.Queue()
+        for _ in range(size):
+            self._predictors.put(load_predictor(checkpoint, backend, torch_threads))
+
+    @contextmanager
+    def predictor(self):
+        """
+        Borrow a predictor from the pool (wait until one is free).
+        """
+        predictor = self._predictors.get()
+        try:
+            yield predictor
+        finally:
+            self._predictors.put(predictor)
+
+    def pil_image(self, pil_im):
+        """
+        Same as openpifpaf.Predictor.pil_image with a predictor of the pool.
+        """
+        with self.predictor() as predictor:
+            return predictor.pil_image(pil_im)
+
+    def pil_images(self, pil_ims: list):
+        """Predict the key points of several images with batched forward passes.
+
+        The images with the same size are stacked in one batch (openpifpaf can only stack tensors of the
+        same shape), so the views of one camera go through the network in a single pass.
+
+        Parameters
+        ----------
+        pil_ims : list of PIL images
+            The images to process.
+
+        Returns
+        -------
+        list
+            The predictions of each image, in the same order as pil_ims.
+        """
+        groups = {}
+        for i, pil_im in enumerate(pil_ims):
+            groups.setdefault(pil_im.size, []).append(i)
+        predictions = [None] * len(pil_ims)
+        with self.predictor() as predictor:
+            for indices in groups.values():
+                predictor.batch_size = len(indices)
+                batch = predictor.pil_images([pil_ims[i] for i in indices])
+                for i, (prediction, _, _) in zip(indices, batch):
+                    predictions[i] = prediction
+        return predictions
+
+
+def configure_predictor_pool(size: int = None, torch_threads: int = None, backend: str = None):
+    """
+    Set the configuration of the predictor pool of the process without loading it (the options left to None are
+    not changed). It has no effect once the pool is loaded.
+    """
+    options = {"size": size, "torch_threads": torch_threads, "backend": backend}
+    with _pool_lock:
+        _pool_options.update({name: value for name, value in options.items() if value is not None})
+
+
+def get_predictor_pool(size: int = None, torch_threads: int = None, backend: str = None):
+    """
+    Return the predictor pool of the process, it is loaded on the first call (with the given configuration).
+    """
+    global _pool
+    configure_predictor_pool(size, torch_threads, backend)
+    with _pool_lock:
+        if _pool is None:
+            _pool = PredictorPool(**_pool_options)
+        return _pool
+
+
+def pose_backend():
+    """
+    Return the backend of the predictor pool of the process (the configured one if it is not loaded yet).
+    """
+    return _pool_options["backend"] if _pool is None else _pool.backend
+
+
+def predict_keypoints(pil_ims: list, cache_keys: list = None):
+    """Return the key points of the person in each image (openpifpaf wholebody, shape (133, 3) with x, y and the
+    confidence), from the cache when they were already predicted with the configured backend, with batched
+    passes of the predictor pool otherwise (the pool is only loaded if an image is not in the cache).
+
+    Parameters
+    ----------
+    pil_ims : list of PIL images
+        The images.
+    cache_keys : list of str
+        The cache key of each image (given by content_key), None to not use the cache.
+
+    Returns
+    -------
+    list of numpy arrays
+        The key points of each image, in the same order as pil_ims.
+    """
+    cache_keys = cache_keys or [None] * len(pil_ims)
+    name = f"keypoints_{pose_backend()}"
+    keypoints = []
+    for key in cache_keys:
+        cached = load_arrays(key, (name,))
+        keypoints.append(None if cached is None else np.array(cached[name]))
+    missing = [i for i, points in enumerate(keypoints) if points is None]
+    if missing:
+        predictions = get_predictor_pool().pil_images([pil_ims[i] for i in missing])
+        for i, prediction in zip(missing, predictions):
+            keypoints[i] = prediction[0].data
+            store_arrays(cache_keys[i], **{name: keypoints[i]})
+    return keypoints
+
+
+def benchmark(pil_ims: list, backends: tuple = BACKENDS, repeat: int = 3, threads: int = 0):
+    """Compare the latency and the key points of the pose backends on some images.
+
+    Parameters
+    ----------
+    pil_ims : list of PIL images
+        The images to process (the person has to be found in each of them).
+    backends : tuple
+        The backends compared, the first one is the reference of the key point errors.
+    repeat : int
+        The number of times every image is processed.
+    threads : int
+        The number of threads used by the network inside an operation (0 to keep the default).
+
+    Returns
+    -------
+    dict
+        For each backend, the mean latency per image (ms) and the mean and maximum distance (pixels) between
+        its key points (KEYPOINTS) and the ones of the reference.
+    """
+    if threads > 0:
+        import torch
+
+        torch.set_num_threads(threads)
+    results, reference = {}, None
+    for backend in backends:
+        predictor = load_predictor(CHECKPOINT, backend, threads)
+        # the first call loads everything lazily
+        predictor.pil_image(pil_ims[0])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            keypoints = [predictor.pil_image(pil_im)[0][0].data[KEYPOINTS, 0:2] for pil_im in pil_ims]
+        latency = (time.perf_counter() - start) / (repeat * len(pil_ims)) * 1000
+        if reference is None:
+            reference = keypoints
+        errors = np.linalg.norm(np.array(keypoints) - np.array(reference), axis=2)
+        results[backend] = {"latency": latency, "mean_error": errors.mean(), "max_error": errors.max()}
+        print(f"{backend:>10}: {latency:8.1f} ms/image, key points error mean {errors.mean():.2f} px, max {errors.max():.2f} px")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the pose backends")
+    parser.add_argument("images", nargs="+", help="The images (or glob patterns) to process")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Enter the number of times every image is processed")
+    parser.add_argument("-b", "--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS, help="Enter the backends to compare, the first one is the reference")
+    parser.add_argument("--threads", type=int, default=0, help="Enter the number of threads used by the network (0 for the default)")
+    args = parser.parse_args()
+
+    paths = sorted(path for pattern in args.images for path in glob.glob(pattern))
+    benchmark([Image.open(path).convert("RGB") for path in paths], tuple(args.backends), args.repeat, args.threads)
@@ -0,0 +1,105 @@
+import os
+
+import openpifpaf
+import torch
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# the exported networks are kept next to the sources, they are created once per checkpoint
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+def onnx_path(checkpoint: str, quantize: bool = False):
+    """
+    Return the path of the ONNX file of a checkpoint (the int8 one if quantize).
+    """
+    return os.path.join(MODELS_DIR, f"{checkpoint}{'-int8' if quantize else ''}.onnx")
+
+
+def export_onnx(checkpoint: str, quantize: bool = False):
+    """Export the openpifpaf network of a checkpoint to ONNX, nothing is done if the file already exists.
+
+    Parameters
+    ----------
+    checkpoint : str
+        The openpifpaf checkpoint.
+    quantize : bool
+        True to also write the network with its weights dynamically quantized to int8.
+
+    Returns
+    -------
+    str
+        The path of the ONNX file (the quantized one if quantize).
+    """
+    path = onnx_path(checkpoint)
+    if not os.path.exists(path):
+        os.makedirs(MODELS_DIR, exist_ok=True)
+        model, _ = openpifpaf.network.Factory(checkpoint=checkpoint).factory()
+        model.eval()
+        # the heads have to be traced without in-place operations (as in openpifpaf.export_onnx)
+        openpifpaf.network.heads.CompositeField4.inplace_ops = False
+        # the images are padded by the predictor so the height and the width are dynamic like the batch
+        image_batch = torch.zeros((1, 3, 97, 129))
+        output_names = [head_meta.name for head_meta in model.head_metas]
+        dynamic_axes = {name: {0: "batch", 2: "height", 3: "width"} for name in ["input_batch"] + output_names}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                image_batch,
+                path,
+                input_names=["input_batch"],
+                output_names=output_names,
+                dynamic_axes=dynamic_axes,
+                opset_version=11,
+            )
+    if not quantize:
+        return path
+    quantized_path = onnx_path(checkpoint, quantize=True)
+    if not os.path.exists(quantized_path):
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class OnnxModel:
+    """Run the exported network with ONNX Runtime on the CPU.
+
+    It replaces the torch model of an openpifpaf.Predictor: it takes the preprocessed image batch and returns
+    the fields of the heads, so the preprocessing and the decoding of openpifpaf (and the keypoint indices) are
+    the same as with the torch network.
+    """
+
+    def __init__(self, path: str, threads: int = 0):
+        """
+        Parameters
+        ----------
+        path : str
+            The path of the ONNX file.
+        threads : int
+            The number of threads used inside an operation (0 to keep the ONNX Runtime default).
+        """
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, image_batch):
+        outputs = self.session.run(None, {self.input_name: image_batch.cpu().numpy()})
+        return [torch.from_numpy(output) for output in outputs]
+
+
+def onnx_predictor(checkpoint: str, quantize: bool = False, threads: int = 0):
+    """
+    Return an openpifpaf.Predictor whose network runs with ONNX Runtime (exported on the first call).
+    """
+    if not ONNXRUNTIME_AVAILABLE:
+        raise ImportError("The onnx pose backend needs onnxruntime (pip install onnx onnxruntime)")
+    predictor = openpifpaf.Predictor(checkpoint=checkpoint)
+    predictor.model = OnnxModel(export_onnx(checkpoint, quantize), threads)
+    return predictor
@@ -0,0 +1,204 @@
+import numpy as np
+
+from src.utils.ray_kernels import kernel_edges, cast_rays_kernel
+
+
+def _hit_zone(edges: np.ndarray, rows: np.ndarray, cols: np.ndarray):
+    """
+    Return True where the pixel (rows, cols) of the edges is an edge pixel (== 255 on any channel).
+    """
+    hit_zone = edges[rows, cols] == 255
+    if hit_zone.ndim > rows.ndim:
+        hit_zone = np.any(hit_zone, axis=-1)
+    return hit_zone
+
+
+def _axis_crossings(start: np.ndarray, direction: np.ndarray, n_lines: int):
+    """
+    Compute the distances at which rays cross the next n_lines integer grid lines of one axis.
+    Rays parallel to the axis get np.inf.
+    """
+    steps = np.arange(n_lines)
+    forward = direction > 0
+    first = np.where(forward, np.floor(start) + 1, np.ceil(start) - 1)
+    step = np.where(forward, 1, -1)
+    lines = first[:, None] + step[:, None] * steps[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossings = (lines - start[:, None]) / direction[:, None]
+    crossings[direction == 0] = np.inf
+    return crossings
+
+
+def _ray_cells(origins: np.ndarray, angles: np.ndarray, shape: tuple, n_lines: int):
+    """
+    List the cells visited by the rays until they cross n_lines grid lines on one of the axes.
+
+    Returns the row and column of every visited cell, whether it is visited before the ray leaves the grid,
+    whether the ray left the grid and the distance travelled.
+    """
+    n_rays = origins.shape[0]
+    height, width = shape[:2]
+    start_row, start_col = origins[:, 0], origins[:, 1]
+    dir_row, dir_col = np.cos(angles), np.sin(angles)
+
+    # every distance where the ray enters a new cell, the cell is sampled in the middle of each interval
+    crossings_row = _axis_crossings(start_row, dir_row, n_lines)
+    crossings_col = _axis_crossings(start_col, dir_col, n_lines)
+    travelled = np.minimum(crossings_row[:, -1], crossings_col[:, -1])
+    crossings = np.concatenate((crossings_row, crossings_col), axis=1)
+    crossings.sort(axis=1)
+    middles = (crossings[:, :-1] + crossings[:, 1:]) / 2
+    distances = np.concatenate((np.zeros((n_rays, 1)), crossings[:, :1] / 2, middles), axis=1)
+    traversed = np.isfinite(distances) & (distances <= travelled[:, None])
+    distances[~traversed] = 0
+
+    # int() in pt_from truncates towards zero
+    rows = np.trunc(start_row[:, None] + dir_row[:, None] * distances).astype(int)
+    cols = np.trunc(start_col[:, None] + dir_col[:, None] * distances).astype(int)
+    in_grid = (0 <= rows) & (rows < height) & (0 <= cols) & (cols < width)
+    left = np.any(traversed & ~in_grid, axis=1)
+    # the ray stops as soon as it leaves the grid
+    inside = np.cumprod(traversed & in_grid, axis=1).astype(bool)
+    return rows, cols, inside, left, travelled
+
+
+def _traverse(origins: np.ndarray, angles: np.ndarray, edges: np.ndarray, n_lines: int):
+    """
+    Traverse the rays cell by cell (DDA) until they cross n_lines grid lines on one of the axes.
+
+    Returns the hit pixels in the (x, y) order, whether each ray hit an edge, whether it left the image,
+    and the distance travelled by the rays that did neither.
+    """
+    n_rays = origins.shape[0]
+    rows, cols, inside, left, travelled = _ray_cells(origins, angles, edges.shape, n_lines)
+
+    hit = np.zeros(inside.shape, dtype=bool)
+    hit[inside] = _hit_zone(edges, rows[inside], cols[inside])
+    found = hit.any(axis=1)
+    first = hit.argmax(axis=1)
+    index = np.arange(n_rays)
+    points = np.full((n_rays, 2), -1, dtype=int)
+    points[found, 0] = cols[index, first][found]
+    points[found, 1] = rows[index, first][found]
+    return points, found, left & ~found, travelled
+
+
+def cast_rays(origins: np.ndarray, angles, edges: np.ndarray):
+    """Cast several rays at once and find the first edge pixel hit by each of them.
+
+    The rays are traversed exactly, cell by cell (DDA), so the visited pixels are the same as when walking
+    along the ray with pt_from in very small steps, without the per-step Python loop.
+    If edges is an EdgeDistanceField, its precomputed distances are used to skip the empty parts of the rays.
+    If edges is a ContourEdges, the rays are intersected with the contour segments instead (sub-pixel hits).
+    When Numba is installed, the edges images are traversed by a compiled kernel instead.
+
+    Parameters
+    ----------
+    origins : numpy array
+        The starting points of the rays, shape (N, 2), in the [row, column] order used by pt_from.
+    angles : float or numpy array
+        The angle of each ray (radians), same convention as pt_from (0 is along the rows).
+    edges : numpy array, EdgeDistanceField or ContourEdges
+        The edges image, a pixel is an edge if it equals 255 (on any channel).
+
+    Returns
+    -------
+    numpy array
+        The hit pixels, shape (N, 2), in the (x, y) image order used by find_edge. -1 where nothing is hit.
+    numpy array
+        Boolean array of shape (N,), True if the ray hit an edge before leaving the image.
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    angles = np.broadcast_to(np.asarray(angles, dtype=float), (origins.shape[0],))
+    plane = kernel_edges(edges)
+    if plane is not None:
+        return cast_rays_kernel(origins, angles, plane)
+    if hasattr(edges, "cast_rays"):
+        return edges.cast_rays(origins, angles)
+    points, found, _, _ = _traverse(origins, angles, edges, max(edges.shape[:2]) + 2)
+    return points, found
+
+
+class PolarEdgeProfile:
+    """The first edge pixel hit around a pivot for regularly spaced angles, cast on demand.
+
+    The angles turn from the start angle in either direction (up to one full turn). A sweep casts its rays in
+    growing chunks and stops at the first chunk where the norm of the hit pixel decreases, so it only casts a few
+    more rays than the angles it needs. The hits already cast are kept for the later queries on the same pivot.
+
+    Attributes
+    ----------
+    n_steps : int
+        The number of steps of one full turn.
+    """
+
+    def __init__(self, pivot: np.ndarray, edges: np.ndarray, start_angle: float = 0.0, step: float = 0.01,
+                 chunk_size: int = 16):
+        """
+        Parameters
+        ----------
+        pivot : numpy array
+            The center of the profile in the [row, column] order used by pt_from.
+        edges : numpy array
+            The edges image.
+        start_angle : float
+            The angle (radians) the sweeps start from.
+        step : float
+            The angle (radians) between two samples.
+        chunk_size : int
+            The number of rays of the first chunk of a sweep, each next chunk is twice as large.
+        """
+        self.pivot = np.asarray(pivot, dtype=float)
+        self.edges = edges
+        self.start_angle = start_angle
+        self.step = step
+        self.chunk_size = chunk_size
+        self.n_steps = int(np.ceil(2 * np.pi / step))
+        # the hits of the angles start_angle + direction * step * k already cast, by direction (1 or -1)
+        self._points = {1: np.empty((0, 2), dtype=int), -1: np.empty((0, 2), dtype=int)}
+        self._found = {1: np.empty(0, dtype=bool), -1: np.empty(0, dtype=bool)}
+
+    def _cast(self, direction: int, count: int):
+        """
+        Cast the rays of the next count angles turning in direction, without going past one full turn.
+        """
+        cast = len(self._found[direction])
+        k = np.arange(cast, min(cast + count, self.n_steps + 1))
+        angles = self.start_angle + direction * self.step * k
+        points, found = cast_rays(np.broadcast_to(self.pivot, (len(angles), 2)), angles, self.edges)
+        self._points[direction] = np.concatenate((self._points[direction], points))
+        self._found[direction] = np.concatenate((self._found[direction], found))
+
+    def sweep(self, direction: int):
+        """Turn from the start angle until the norm of the hit pixel (0 if nothing is hit) decreases.
+
+        Parameters
+        ----------
+        direction : int
+            1 to turn towards the larger angles, -1 towards the smaller ones.
+
+        Returns
+        -------
+        int
+            The number of steps of the first angle where the norm is lower than at the previous one (n_steps if
+            it never decreases within one full turn).
+        """
+        count = self.chunk_size
+        while True:
+            self._cast(direction, count)
+            norms = np.where(self._found[direction], np.linalg.norm(self._points[direction], axis=1), 0)
+            decrease = norms[1:] < norms[:-1]
+            if np.any(decrease):
+                return int(np.argmax(decrease)) + 1
+            if len(norms) > self.n_steps:
+                return self.n_steps
+            count *= 2
+
+    def hit(self, direction: int, k: int):
+        """
+        Return the hit of the angle k steps from the start in direction like find_edge does: [(x, y)] or [] if
+        nothing is hit.
+        """
+        if k >= len(self._found[direction]):
+            self._cast(direction, k + 1 - len(self._found[direction]))
+        return [tuple(self._points[direction][k])] if self._found[direction][k] else []
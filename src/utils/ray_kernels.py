@@ -0,0 +1,118 @@
+import numpy as np
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+
+@njit(nogil=True, cache=True)
+def _cast_ray(start_row, start_col, dir_row, dir_col, edges):
+    """
+    Walk one ray pixel by pixel (same samples as ray_casting._ray_cells) and return the hit pixel (x, y) or (-1, -1).
+    """
+    height, width = edges.shape
+    if dir_row > 0:
+        line_row, step_row = np.floor(start_row) + 1, 1.0
+    else:
+        line_row, step_row = np.ceil(start_row) - 1, -1.0
+    if dir_col > 0:
+        line_col, step_col = np.floor(start_col) + 1, 1.0
+    else:
+        line_col, step_col = np.ceil(start_col) - 1, -1.0
+    cross_row = (line_row - start_row) / dir_row if dir_row != 0 else np.inf
+    cross_col = (line_col - start_col) / dir_col if dir_col != 0 else np.inf
+
+    last_crossing = 0.0
+    distance = 0.0
+    while True:
+        # int() in pt_from truncates towards zero
+        row = int(start_row + dir_row * distance)
+        col = int(start_col + dir_col * distance)
+        if not (0 <= row < height and 0 <= col < width):
+            return -1, -1
+        if edges[row, col] == 255:
+            return col, row
+        if cross_row <= cross_col:
+            crossing = cross_row
+            line_row += step_row
+            cross_row = (line_row - start_row) / dir_row
+        else:
+            crossing = cross_col
+            line_col += step_col
+            cross_col = (line_col - start_col) / dir_col
+        if not np.isfinite(crossing):
+            return -1, -1
+        # the pixel is sampled in the middle of the interval between two crossings
+        distance = (last_crossing + crossing) / 2
+        last_crossing = crossing
+
+
+@njit(nogil=True, cache=True)
+def _cast_rays(origins, dir_rows, dir_cols, edges):
+    """
+    Cast every ray with _cast_ray.
+    """
+    n_rays = origins.shape[0]
+    points = np.full((n_rays, 2), -1, dtype=np.int64)
+    found = np.zeros(n_rays, dtype=np.bool_)
+    for i in range(n_rays):
+        x, y = _cast_ray(origins[i, 0], origins[i, 1], dir_rows[i], dir_cols[i], edges)
+        if x >= 0:
+            points[i, 0], points[i, 1] = x, y
+            found[i] = True
+    return points, found
+
+
+@njit(nogil=True, cache=True)
+def _sweep(start_row, start_col, dir_rows, dir_cols, edges):
+    """
+    Cast the rays one after the other until the norm of the hit pixel decreases (0 if nothing is hit).
+    Return the index of that ray (the last index if the norm never decreases).
+    """
+    previous = 0.0
+    for i in range(dir_rows.shape[0]):
+        x, y = _cast_ray(start_row, start_col, dir_rows[i], dir_cols[i], edges)
+        norm = np.sqrt(x * x + y * y) if x >= 0 else 0.0
+        if i > 0 and norm < previous:
+            return i
+        previous = norm
+    return dir_rows.shape[0] - 1
+
+
+def kernel_edges(edges):
+    """
+    Return the single channel edges image the compiled kernels run on, None if they cannot be used
+    (Numba is not installed or the edges are not an image, like ContourEdges).
+    """
+    if not NUMBA_AVAILABLE:
+        return None
+    edges = getattr(edges, "edges", edges)
+    if not isinstance(edges, np.ndarray):
+        return None
+    if edges.ndim == 3:
+        edges = np.where(np.any(edges == 255, axis=2), 255, 0).astype(np.uint8)
+    return edges
+
+
+def cast_rays_kernel(origins: np.ndarray, angles: np.ndarray, edges: np.ndarray):
+    """
+    Compiled version of ray_casting.cast_rays, the edges have to come from kernel_edges.
+    The kernel releases the GIL so the rays of different measurements can be cast from several threads.
+    """
+    origins = np.ascontiguousarray(origins, dtype=float)
+    return _cast_rays(origins, np.cos(angles), np.sin(angles), edges)
+
+
+def sweep_kernel(origin: np.ndarray, angles: np.ndarray, edges: np.ndarray):
+    """
+    Compiled angular sweep of get_maximum_pit, the edges have to come from kernel_edges.
+    Return the index of the first angle where the norm of the edge found decreases (the last index if none).
+    """
+    return _sweep(float(origin[0]), float(origin[1]), np.cos(angles), np.sin(angles), edges)
+
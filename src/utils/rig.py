@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+
+import numpy as np
+import cv2 as cv
+
+from src.utils.cache import save_npz
+from src.utils.calibration import CALIBRATION_DIR, calibration_hash
+from src.utils.image_config import find_chessboards, chessboard_ratios
+
+# the chessboards found in the views are kept for the capture session (the camera and the wall do not move)
+RIG_DIR = os.environ.get("IM2MEAS_RIG_DIR", os.path.join(CALIBRATION_DIR, "rig"))
+RIG_SESSION = os.environ.get("IM2MEAS_RIG_SESSION", "default")  # each session has its own folder in RIG_DIR
+RIG_TTL = float(os.environ.get("IM2MEAS_RIG_TTL", 8 * 3600))  # seconds a rig is used after its detection
+RIG_MARGIN = 6  # the margin (working image pixels) around each chessboard in its template
+RIG_SHIFT = 3  # how far (working image pixels) the templates are searched around their position
+RIG_MATCH = 0.9  # the minimum normalized correlation of a template with the view
+
+_rigs = {}
+_lock = threading.Lock()
+
+
+def _rig_path(key: str):
+    return os.path.join(RIG_DIR, RIG_SESSION, f"{key}.npz")
+
+
+def rig_key(image: np.ndarray, original_image):
+    """
+    Return the key of the rig of a view: its device, its size, its orientation and the calibration applied to it
+    (the hash of the intrinsics of the device), the ratios of undistorted and raw images are never mixed.
+    """
+    calibration = calibration_hash(original_image.device) if original_image.calibration else "raw"
+    orientation = "upright" if original_image.orientation is None else original_image.orientation.name
+    return f"{original_image.device}_{image.shape[1]}x{image.shape[0]}_{orientation}_{calibration}"
+
+
+def _load_rig(key: str):
+    """
+    Return the rig geometry of a key, from the memory or from the folder of the session (None if it is unknown or
+    if it was detected more than RIG_TTL seconds ago).
+    """
+    with _lock:
+        if key in _rigs and time.time() - _rigs[key]["detected"] <= RIG_TTL:
+            return _rigs[key]
+    path = _rig_path(key)
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > RIG_TTL:
+        return None
+    data = np.load(path)
+    if "working_ratios" not in data.files:
+        # saved with the full resolution ratios, which depend on the size of the capture
+        return None
+    rig = {
+        "detected": os.path.getmtime(path),
+        "ratios": data["working_ratios"],
+        "boxes": data["boxes"],
+        "templates": [data[f"template_{i}"] for i in range(len(data["boxes"]))],
+    }
+    with _lock:
+        _rigs[key] = rig
+    return rig
+
+
+def _save_rig(key: str, gray: np.ndarray, contours: list, ratios: tuple, min_ratio: float):
+    """
+    Keep the ratios of a view and the templates of its chessboards, both in the working image (its ratios do not
+    depend on the resolution of the capture).
+    """
+    boxes, templates = [], []
+    for contour in contours:
+        x_min, y_min = np.floor(contour.min(axis=0) * min_ratio).astype(int) - RIG_MARGIN
+        x_max, y_max = np.ceil(contour.max(axis=0) * min_ratio).astype(int) + RIG_MARGIN
+        x_min, y_min = max(x_min, RIG_SHIFT), max(y_min, RIG_SHIFT)
+        x_max, y_max = min(x_max, gray.shape[1] - RIG_SHIFT), min(y_max, gray.shape[0] - RIG_SHIFT)
+        boxes.append([x_min, y_min, x_max, y_max])
+        templates.append(gray[y_min:y_max, x_min:x_max].copy())
+    rig = {"detected": time.time(), "ratios": np.array(ratios), "boxes": np.array(boxes), "templates": templates}
+    save_npz(_rig_path(key), working_ratios=rig["ratios"], boxes=rig["boxes"], **{f"template_{i}": t for i, t in enumerate(templates)})
+    with _lock:
+        _rigs[key] = rig
+
+
+def _verify_rig(gray: np.ndarray, rig: dict):
+    """
+    Check that every chessboard of the rig is still at its position in a view: its template has to match the
+    view at the same place (one pixel of tolerance).
+    """
+    for (x_min, y_min, x_max, y_max), template in zip(rig["boxes"], rig["templates"]):
+        region = gray[y_min - RIG_SHIFT : y_max + RIG_SHIFT, x_min - RIG_SHIFT : x_max + RIG_SHIFT]
+        if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]:
+            return False
+        scores = cv.matchTemplate(region, template, cv.TM_CCOEFF_NORMED)
+        _, score, _, location = cv.minMaxLoc(scores)
+        if score < RIG_MATCH or max(abs(location[0] - RIG_SHIFT), abs(location[1] - RIG_SHIFT)) > 1:
+            return False
+    return True
+
+
+def rig_ratios(image: np.ndarray, original_image, min_ratio: float):
+    """Return the ratios of get_ratio for a view, from the rig cache when its chessboards are still at the cached
+    positions (checked with a template match on the working image, the full resolution image is then never
+    decoded), with the full detection otherwise (the cache is then updated).
+
+    Parameters
+    ----------
+    image : numpy array
+        The working image of the view (before anything is drawn on it).
+    original_image : FullResolution
+        The full resolution image of the view.
+    min_ratio : float
+        The ratio used to resize the image.
+
+    Returns
+    -------
+    tuple
+        The two ratios of get_ratio.
+    """
+    key = rig_key(image, original_image)
+    gray = cv.cvtColor(image, cv.COLOR_RGB2GRAY)
+    rig = _load_rig(key)
+    if rig is not None and _verify_rig(gray, rig):
+        ratio, ratio2 = rig["ratios"]
+        return ratio, ratio2
+    # the full resolution pixels only live during the detection
+    contours = find_chessboards(original_image.load())
+    ratio, ratio2 = chessboard_ratios(contours)
+    ratios = ratio * min_ratio, ratio2 * min_ratio
+    if all(contour is not None for contour in contours):
+        _save_rig(key, gray, contours, ratios, min_ratio)
+    return ratios
@@ -0,0 +1,179 @@
+import os
+import glob
+import time
+import argparse
+import threading
+
+import numpy as np
+import cv2 as cv
+from PIL import Image
+
+# the rembg model removing the background (u2net, u2netp, silueta, isnet-general-use, ...), can be changed with
+# this environment variable (used by the server)
+REMBG_MODEL = os.environ.get("IM2MEAS_REMBG_MODEL", "u2net")
+
+# background plate subtraction
+PLATE_FEATURES = 2000  # the number of ORB features used to register the plate on a view
+PLATE_MIN_INLIERS = 30  # under this number of matches the registration is considered failed
+PLATE_THRESHOLD = 30  # the minimum color difference (Lab) between a view and the plate on the silhouette
+PLATE_AREA = (0.01, 0.6)  # the fraction of the image the silhouette can cover, the mask is rejected otherwise
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(model: str = REMBG_MODEL):
+    """
+    Return the rembg session of a model, it is created on the first call and shared by the whole process.
+    """
+    with _sessions_lock:
+        if model not in _sessions:
+            # rembg (and onnxruntime) takes a second to import, it is only imported when a session is created
+            from rembg import new_session
+
+            _sessions[model] = new_session(model)
+        return _sessions[model]
+
+
+def remove_background(image: np.ndarray, model: str = REMBG_MODEL):
+    """
+    Remove the background of an image with the shared session of the model (same output as rembg.remove).
+    """
+    from rembg import remove
+
+    return remove(image, session=get_session(model))
+
+
+def register_plate(image: np.ndarray, plate: np.ndarray):
+    """
+    Warp the background plate onto a view with the homography between their ORB features (the chessboards
+    and the wall), it compensates the small moves of the camera. Return None if it cannot be registered.
+    """
+    orb = cv.ORB_create(PLATE_FEATURES)
+    image_points, image_descriptors = orb.detectAndCompute(cv.cvtColor(image, cv.COLOR_RGB2GRAY), None)
+    plate_points, plate_descriptors = orb.detectAndCompute(cv.cvtColor(plate, cv.COLOR_RGB2GRAY), None)
+    if image_descriptors is None or plate_descriptors is None:
+        return None
+    matches = cv.BFMatcher(cv.NORM_HAMMING, crossCheck=True).match(plate_descriptors, image_descriptors)
+    if len(matches) < PLATE_MIN_INLIERS:
+        return None
+    source = np.float32([plate_points[match.queryIdx].pt for match in matches])
+    destination = np.float32([image_points[match.trainIdx].pt for match in matches])
+    homography, inliers = cv.findHomography(source, destination, cv.RANSAC, 3.0)
+    if homography is None or np.sum(inliers) < PLATE_MIN_INLIERS:
+        return None
+    return cv.warpPerspective(plate, homography, image.shape[1::-1], borderMode=cv.BORDER_REPLICATE)
+
+
+def plate_mask(image: np.ndarray, plate: np.ndarray):
+    """Compute the silhouette mask of a view by difference with the registered background plate.
+
+    Parameters
+    ----------
+    image : numpy array
+        The RGB view.
+    plate : numpy array
+        The RGB background plate registered on the view.
+
+    Returns
+    -------
+    numpy array
+        The boolean mask of the silhouette (the largest blob, without holes).
+    """
+    image = cv.GaussianBlur(image, (5, 5), 0).astype(np.float32)
+    plate = cv.GaussianBlur(plate, (5, 5), 0).astype(np.float32)
+    # the gain between the plate and the view (exposure, luminosity option) is measured on the background
+    # (on one pixel out of 4 in each direction, it is enough for a median)
+    gain = np.median(image[::4, ::4].reshape(-1, 3), axis=0) / np.maximum(np.median(plate[::4, ::4].reshape(-1, 3), axis=0), 1)
+    plate = np.clip(plate * gain, 0, 255)
+    image_lab = cv.cvtColor(image / 255, cv.COLOR_RGB2Lab)
+    plate_lab = cv.cvtColor(plate / 255, cv.COLOR_RGB2Lab)
+    difference = np.abs(image_lab - plate_lab)
+    # the lightness counts for less so the shadows on the wall are not taken
+    difference = np.maximum(difference[:, :, 0] / 2, np.maximum(difference[:, :, 1], difference[:, :, 2]))
+    mask = (difference > PLATE_THRESHOLD).astype(np.uint8)
+
+    mask = cv.morphologyEx(mask, cv.MORPH_OPEN, cv.getStructuringElement(cv.MORPH_ELLIPSE, (5, 5)))
+    mask = cv.morphologyEx(mask, cv.MORPH_CLOSE, cv.getStructuringElement(cv.MORPH_ELLIPSE, (15, 15)))
+    n_labels, labels, stats, _ = cv.connectedComponentsWithStats(mask)
+    silhouette = np.zeros_like(mask)
+    if n_labels > 1:
+        largest = 1 + np.argmax(stats[1:, cv.CC_STAT_AREA])
+        contours, _ = cv.findContours((labels == largest).astype(np.uint8), cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        cv.drawContours(silhouette, contours, -1, 1, cv.FILLED)
+    return silhouette.astype(bool)
+
+
+def subtract_plate(image: np.ndarray, plate: np.ndarray):
+    """
+    Remove the background of a view with the background plate, same output as rembg.remove (RGBA with the
+    background set to 0). Return None if the plate cannot be registered or the silhouette is not plausible.
+    """
+    registered = register_plate(image, plate)
+    if registered is None:
+        return None
+    mask = plate_mask(image, registered)
+    if not PLATE_AREA[0] <= mask.mean() <= PLATE_AREA[1]:
+        return None
+    return np.dstack((image * mask[:, :, None], mask * 255)).astype(np.uint8)
+
+
+def segment(image: np.ndarray, model: str = REMBG_MODEL, plate: np.ndarray = None):
+    """
+    Remove the background of a view, by subtracting the background plate if there is one, with rembg
+    otherwise (or if the subtraction fails).
+    """
+    if plate is not None:
+        im = subtract_plate(image, plate)
+        if im is not None:
+            return im
+        print("The background plate could not be subtracted, rembg is used")
+    return remove_background(image, model)
+
+
+def benchmark(images: list, models: tuple, repeat: int = 3):
+    """Compare the latency and the masks of rembg models on some images.
+
+    Parameters
+    ----------
+    images : list of numpy arrays
+        The images to process (resized like in the pipeline).
+    models : tuple
+        The rembg models compared, the first one is the reference of the masks.
+    repeat : int
+        The number of times every image is processed.
+
+    Returns
+    -------
+    dict
+        For each model, the mean latency per image (ms) and the mean and minimum intersection over union
+        between its masks and the ones of the reference.
+    """
+    results, reference = {}, None
+    for model in models:
+        # the first call creates the session
+        remove_background(images[0], model)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            masks = [np.asarray(remove_background(image, model))[:, :, 3] > 127 for image in images]
+        latency = (time.perf_counter() - start) / (repeat * len(images)) * 1000
+        if reference is None:
+            reference = masks
+        iou = np.array([np.sum(mask & ref) / max(np.sum(mask | ref), 1) for mask, ref in zip(masks, reference)])
+        results[model] = {"latency": latency, "mean_iou": iou.mean(), "min_iou": iou.min()}
+        print(f"{model:>18}: {latency:8.1f} ms/image, mask IoU mean {iou.mean():.3f}, min {iou.min():.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    from src.utils.image_config import _resize
+
+    parser = argparse.ArgumentParser(description="Benchmark of the rembg models")
+    parser.add_argument("images", nargs="+", help="The images (or glob patterns) to process")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Enter the number of times every image is processed")
+    parser.add_argument("-m", "--models", nargs="+", default=["u2net", "u2netp", "silueta"], help="Enter the rembg models to compare, the first one is the reference")
+    args = parser.parse_args()
+
+    paths = sorted(path for pattern in args.images for path in glob.glob(pattern))
+    images = [np.asarray(_resize(Image.open(path).convert("RGB"))[0]) for path in paths]
+    benchmark(images, tuple(args.models), args.repeat)
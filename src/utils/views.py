@@ -0,0 +1,144 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import numpy as np
+
+from src.utils.image_config import create_resize_remove_im_front, create_resize_remove_im, RESIZE_SIZE
+from src.utils.cache import content_key, load_arrays, store_arrays
+from src.utils.calibration import camera_calibration, calibration_hash, device_name
+from src.utils.segmentation import get_session, REMBG_MODEL
+from src.utils.rig import rig_ratios
+
+# the number of processes preprocessing the views (0 to preprocess them one after the other in the calling process),
+# can be changed with this environment variable (used by the server)
+VIEW_WORKERS = int(os.environ.get("IM2MEAS_VIEW_WORKERS", 0))
+# the arrays of a view kept in the cache
+VIEW_ARRAYS = ("image", "foreground", "ratios")
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def preprocess_view(
+    im_path: str,
+    calibration: int,
+    rotation: int,
+    luminosity: int = None,
+    rembg_model: str = REMBG_MODEL,
+    plate=None,
+    cache_key: str = None,
+):
+    """Preprocess one view: load, resize, remove the background, rotate and calibrate it, then find the
+    chessboards ratios. The working image, the image without background and the ratios are taken from the cache
+    when the view was already preprocessed with the same parameters. The edges of the silhouette are only built
+    (by YeadonModel) for the views that are measured again.
+
+    Parameters
+    ----------
+    im_path : str
+        The path to the image of the view.
+    calibration : int
+    rotation : int
+    luminosity : int
+        None for the views other than the front one (their luminosity is never changed).
+    rembg_model : str
+        The rembg model removing the background.
+    plate : numpy array
+        The background plate given by load_plate (None to use rembg).
+    cache_key : str
+        The cache key of the view given by view_key (None to not use the cache).
+
+    Returns
+    -------
+    PIL Image
+        The image given to the pose network.
+    numpy array
+        The resized image.
+    numpy array
+        The image without background (RGBA).
+    tuple
+        The two chessboards ratios of get_ratio.
+    """
+    cached = load_arrays(cache_key, VIEW_ARRAYS)
+    if cached is not None:
+        image, im, ratios = np.array(cached["image"]), cached["foreground"], tuple(cached["ratios"])
+        pil_im = Image.fromarray(image)
+    else:
+        if luminosity is None:
+            pil_im, image, im, original_img, min_ratio = create_resize_remove_im(im_path, calibration, rotation, rembg_model, plate)
+        else:
+            pil_im, image, im, original_img, min_ratio = create_resize_remove_im_front(im_path, calibration, rotation, luminosity, rembg_model, plate)
+        # the chessboards are only detected (on the full resolution image) when they moved since the previous views
+        ratios = rig_ratios(image, original_img, min_ratio)
+        store_arrays(cache_key, image=image, foreground=im, ratios=np.array(ratios))
+    return pil_im, image, im, ratios
+
+
+def view_key(im_path: str, calibration: int, rotation: int, luminosity: int = None, rembg_model: str = REMBG_MODEL, plate=None, **kwargs):
+    """
+    Return the cache key of a view: the content of its image and the parameters of preprocess_view changing
+    the cached arrays (the other keyword arguments of preprocess_view are ignored). The calibrated views depend
+    on the intrinsics of their device, they are preprocessed again when the device is calibrated again.
+    """
+    return content_key(
+        im_path,
+        calibration=calibration_hash(device_name(Image.open(im_path))) if calibration else calibration,
+        rotation=rotation,
+        luminosity=luminosity,
+        resize=RESIZE_SIZE,
+        rembg_model=rembg_model,
+        plate=plate,
+    )
+
+
+def _init_worker(rembg_model: str):
+    """
+    Create the rembg session when the worker starts so every view it preprocesses reuses it.
+    """
+    get_session(rembg_model)
+
+
+def get_view_executor(workers: int, rembg_model: str = REMBG_MODEL):
+    """
+    Return the process pool preprocessing the views, it is created on the first call and kept warm for the
+    whole process (one per configuration).
+    """
+    with _executors_lock:
+        key = (workers, rembg_model)
+        if key not in _executors:
+            # spawn so the workers do not inherit the threads of torch
+            _executors[key] = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(rembg_model,),
+            )
+        return _executors[key]
+
+
+def preprocess_views(views: list, workers: int = VIEW_WORKERS, rembg_model: str = REMBG_MODEL):
+    """
+    Preprocess several views (the keyword arguments of preprocess_view for each of them) in the worker pool,
+    in the calling process if workers is 0 or 1. Return the results of preprocess_view in the same order.
+    """
+    # the views in the cache are not sent to the workers (the pool is not even created if they all are)
+    cached = [load_arrays(view.get("cache_key"), VIEW_ARRAYS) is not None for view in views]
+    if workers <= 1 or all(cached):
+        return [preprocess_view(rembg_model=rembg_model, **view) for view in views]
+    for view in views:
+        if view["calibration"]:
+            # the calibration of each device is computed once before the workers read it
+            camera_calibration(device_name(Image.open(view["im_path"])))
+    executor = get_view_executor(workers, rembg_model)
+    futures = [
+        None if is_cached else executor.submit(preprocess_view, rembg_model=rembg_model, **view)
+        for view, is_cached in zip(views, cached)
+    ]
+    return [
+        preprocess_view(rembg_model=rembg_model, **view) if future is None else future.result()
+        for view, future in zip(views, futures)
+    ]
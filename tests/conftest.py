@@ -0,0 +1,8 @@
+import pytest
+
+from tests.references import SILHOUETTES, silhouette_edges
+
+
+@pytest.fixture(params=SILHOUETTES)
+def edges(request):
+    return silhouette_edges(request.param)
@@ -0,0 +1,104 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+from src.utils.image_config import thresh
+
+# the implementations before the optimizations, the optimized ones are tested against them
+PICTURES = os.path.join(os.path.dirname(__file__), "pictures")
+SILHOUETTES = ("frontSilhouette", "frontTuckSilhouette", "rTuckSilhouette", "sideSilhouette")
+
+
+def silhouette_edges(name: str, line_size: int = 2, backend: str = "raster"):
+    """
+    Return the edges of a silhouette of tests/pictures as thresh computes them (the silhouettes are dark on white).
+    """
+    im = cv.imread(os.path.join(PICTURES, f"{name}.jpg"))
+    return thresh(255 - im, im.copy(), line_size, backend)
+
+
+def random_rays(edges: np.ndarray, n_rays: int, seed: int = 0):
+    """
+    Return random origins (in the [row, column] order of pt_from) and angles of rays over the edges.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = edges.shape[:2]
+    origins = np.column_stack((rng.uniform(0, height, n_rays), rng.uniform(0, width, n_rays)))
+    return origins, rng.uniform(-np.pi, np.pi, n_rays)
+
+
+def find_edge(p1: np.ndarray, angle_radians, edges: np.ndarray):
+    """
+    The find_edge walk before the ray casting (pt_from every 0.01 pixel), all the steps of the ray at once.
+    """
+    distances = np.arange(0, np.hypot(*edges.shape[:2]) + 1, 0.01)
+    x = (p1[0] + np.cos(angle_radians) * distances).astype(int)
+    y = (p1[1] + np.sin(angle_radians) * distances).astype(int)
+    outside = ~((0 <= x) & (x < edges.shape[0]) & (0 <= y) & (y < edges.shape[1]))
+    stop = np.argmax(outside) if np.any(outside) else len(distances)
+    hit = edges[x[:stop], y[:stop]] == 255
+    if not np.any(hit):
+        return []
+    first = np.argmax(hit)
+    return [(y[first], x[first])]
+
+
+def get_maximum_pit(start: np.ndarray, edges: np.ndarray):
+    """
+    get_maximum_pit before the polar edge profile: one find_edge per angle step on each side.
+    """
+    point = np.array([start[1], start[0]])
+    angle_radians = np.arctan2(0, 5)
+    max_save = find_edge(point, angle_radians, edges)
+    angle_radians_left = angle_radians_right = angle_radians
+    max_save_right = max_save_left = max_save
+    while True:
+        angle_radians_left += 0.01
+        max_last_right = find_edge(point, angle_radians_left, edges)
+        if np.linalg.norm(max_last_right) < np.linalg.norm(max_save_right):
+            break
+        max_save_right = max_last_right
+    while True:
+        angle_radians_right -= 0.01
+        max_last_left = find_edge(point, angle_radians_right, edges)
+        if np.linalg.norm(max_last_left) < np.linalg.norm(max_save_left):
+            break
+        max_save_left = max_last_left
+    point = max(max_save_left, max_last_right)
+    return point[0], int(np.linalg.norm(point))
+
+
+def get_max_approx(top_arr, bottom_arr):
+    """
+    get_max_approx before the vectorization: the last of the maximum norms up to 1.5 times the first one.
+    """
+    norms = np.linalg.norm(np.array(top_arr) - np.array(bottom_arr), axis=1)
+    max_norm = norms[0]
+    save_index = 0
+    for i in range(len(top_arr)):
+        if max_norm <= norms[i] <= norms[0] * 1.5:
+            max_norm = norms[i]
+            save_index = i
+    return save_index
+
+
+def max_pt_sides(start, end, edges):
+    """
+    The 100 points of get_max_pt before the batched rays and their hits on each side, one find_edge walk per ray.
+    """
+    p1, p2 = np.array([start[1], start[0]]), np.array([end[1], end[0]])
+    vector = p2 - p1
+    result = list(zip(np.linspace(p1[0], p2[0], 100), np.linspace(p1[1], p2[1], 100)))
+    angle = np.arctan2(vector[1], vector[0])
+    r_side = [hit for point in result for hit in find_edge(point, angle + np.pi / 2, edges)]
+    l_side = [hit for point in result for hit in find_edge(point, angle - np.pi / 2, edges)]
+    return result, r_side, l_side
+
+
+def get_max_pt(start, end, edges):
+    """
+    get_max_pt before the batched rays.
+    """
+    result, r_side, l_side = max_pt_sides(start, end, edges)
+    return result[get_max_approx(r_side, l_side)][::-1]
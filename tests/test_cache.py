@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import src.utils.cache as cache
+import src.utils.calibration as calibration
+from src.utils.cache import content_key, derived_key, load_arrays, store_arrays, evict
+from src.utils.views import view_key
+from tests.references import PICTURES
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    os.makedirs(cache.CACHE_DIR)
+    return cache.CACHE_DIR
+
+
+def test_content_key_changes_with_the_content_and_the_parameters(tmp_path):
+    path = tmp_path / "view.jpg"
+    path.write_bytes(b"front")
+    key = content_key(str(path), rotation=0, plate=None)
+    assert content_key(str(path), plate=None, rotation=0) == key
+    assert content_key(str(path), rotation=90, plate=None) != key
+    assert content_key(str(path), rotation=0, plate=np.array([1, 2])) != key
+    assert content_key(str(path), rotation=0, plate=np.array([1, 2])) != content_key(
+        str(path), rotation=0, plate=np.array([1, 3])
+    )
+    path.write_bytes(b"side")
+    assert content_key(str(path), rotation=0, plate=None) != key
+
+
+def test_derived_key_changes_with_the_keys_and_the_parameters():
+    key = derived_key("front", "side", line_size=2)
+    assert derived_key("front", "side", line_size=2) == key
+    assert derived_key("front", "tuck", line_size=2) != key
+    assert derived_key("side", "front", line_size=2) != key
+    assert derived_key("front", "side", line_size=1) != key
+
+
+def test_store_and_load_arrays():
+    image = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    store_arrays("key", image=image, ratios=np.array([1.5, 2.0]))
+    arrays = load_arrays("key", ("image", "ratios"))
+    np.testing.assert_array_equal(arrays["image"], image)
+    np.testing.assert_array_equal(arrays["ratios"], [1.5, 2.0])
+    assert load_arrays("key", ("image", "foreground")) is None
+    assert load_arrays("other", ("image",)) is None
+    assert load_arrays(None, ("image",)) is None
+
+
+def test_disabled_cache_stores_nothing(monkeypatch, cache_dir):
+    monkeypatch.setattr(cache, "CACHE_ENABLED", False)
+    store_arrays("key", image=np.zeros(3))
+    assert load_arrays("key", ("image",)) is None
+    assert os.listdir(cache_dir) == []
+
+
+def test_evict_removes_the_least_recently_used_entries(cache_dir):
+    for age, key in enumerate(("newest", "used", "oldest")):
+        store_arrays(key, image=np.zeros(1000, dtype=np.uint8))
+        mtime = 1_000_000 - age * 100
+        os.utime(os.path.join(cache_dir, key), (mtime, mtime))
+    # loading an entry makes it the most recently used one
+    assert load_arrays("used", ("image",)) is not None
+    size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(cache_dir, "used")))
+    evict(2 * size)
+    assert sorted(os.listdir(cache_dir)) == ["newest", "used"]
+    evict(size)
+    assert os.listdir(cache_dir) == ["used"]
+
+
+def test_view_key_changes_with_the_intrinsics(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration, "CALIBRATION_DIR", str(tmp_path / "calibration"))
+    monkeypatch.setattr(calibration, "_intrinsics", {})
+    im_path = os.path.join(PICTURES, "frontSilhouette.jpg")
+    intrinsics = os.path.join(calibration.CALIBRATION_DIR, calibration.device_name(Image.open(im_path)), "intrinsics.npz")
+    cache.save_npz(intrinsics, mtx=np.eye(3), dist=np.zeros(5))
+    key = view_key(im_path, 1, 0)
+    assert view_key(im_path, 1, 0) == key
+    assert view_key(im_path, 0, 0) != key
+
+    cache.save_npz(intrinsics, mtx=2 * np.eye(3), dist=np.zeros(5))
+    calibration._intrinsics.clear()
+    assert view_key(im_path, 1, 0) != key
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+import src.utils.checkpoints as checkpoints
+from src.utils.checkpoints import STAGES, run_dir, run_signature, save_stage, load_stage
+
+
+@pytest.fixture
+def folder(tmp_path):
+    return str(tmp_path / "run")
+
+
+def test_load_stage_round_trip(folder):
+    keypoints = np.arange(6.0).reshape(3, 2)
+    save_stage(folder, "pose", "signature", keypoints={"front": keypoints, "side": {"nested": np.ones(2)}}, ratio=0.5)
+    output = load_stage(folder, "pose", "signature")
+    assert sorted(output) == ["keypoints", "ratio"]
+    np.testing.assert_array_equal(output["keypoints"]["front"], keypoints)
+    np.testing.assert_array_equal(output["keypoints"]["side"]["nested"], np.ones(2))
+    # the numbers are given back as numbers, not as 0-d arrays
+    assert output["ratio"] == 0.5
+    assert not isinstance(output["ratio"], np.ndarray)
+
+
+def test_load_stage_needs_the_same_signature(folder):
+    assert load_stage(folder, "pose", "signature") is None
+    save_stage(folder, "pose", run_signature(distance=350, mass=60), ratio=0.5)
+    assert load_stage(folder, "pose", run_signature(mass=60, distance=350)) is not None
+    assert load_stage(folder, "pose", run_signature(distance=300, mass=60)) is None
+
+
+def test_save_stage_removes_the_next_stages(folder):
+    for stage in STAGES[:-1]:
+        save_stage(folder, stage, "signature", ratio=0.5)
+    save_stage(folder, "pose", "signature", ratio=1.0)
+    saved = [stage for stage in STAGES if load_stage(folder, stage, "signature") is not None]
+    assert saved == ["segment", "pose"]
+
+
+def test_run_dir_is_per_output_folder():
+    assert run_dir("athlete", "club") == os.path.join(checkpoints.RUN_DIR, "club", "athlete")
+    assert run_dir("athlete", "club") != run_dir("athlete", "other_club")
+    assert run_dir("athlete") == os.path.join(checkpoints.RUN_DIR, "athlete")
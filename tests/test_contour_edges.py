@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from src.utils.contour_edges import ContourEdges
+from src.utils.edge_field import EdgeDistanceField
+from src.utils.ray_casting import _traverse
+from tests.references import SILHOUETTES, random_rays, silhouette_edges
+
+
+@pytest.fixture(params=[(name, line_size) for name in SILHOUETTES for line_size in (1, 2)])
+def contour_and_raster(request):
+    name, line_size = request.param
+    return silhouette_edges(name, line_size, "contour"), silhouette_edges(name, line_size)
+
+
+def test_contour_edges_matches_traverse(contour_and_raster):
+    contour, raster = contour_and_raster
+    assert isinstance(contour, ContourEdges)
+    origins, angles = random_rays(raster, 2000)
+    points, found, _, _ = _traverse(origins, angles, raster, max(raster.shape) + 2)
+    contour_points, contour_found = contour.cast_rays(origins, angles)
+    # grazing rays can slip between the drawn pixels of a contour or touch its thickness only
+    assert np.mean(contour_found == found) >= 0.99
+
+    # the contour is the middle of the drawn line: it is hit a little after the raster, never before its pixels
+    both = found & contour_found
+    travelled = np.linalg.norm(points[both][:, ::-1] - origins[both], axis=1)
+    contour_travelled = np.linalg.norm(contour_points[both][:, ::-1] - origins[both], axis=1)
+    assert np.all(contour_travelled >= travelled - 2)
+
+    # the hits are on the drawn contour
+    hits = np.clip(contour_points[contour_found].astype(int), 0, np.array(raster.shape[::-1]) - 1)
+    assert np.all(EdgeDistanceField(raster).distance[hits[:, 1], hits[:, 0]] <= 1.5)
+
+
+def test_contour_edges_misses_outside_the_image(contour_and_raster):
+    contour, raster = contour_and_raster
+    origins = np.array([[-10.0, -10.0], [raster.shape[0] + 5.0, 10.0]])
+    points, found = contour.cast_rays(origins, np.array([np.pi / 4, 0.0]))
+    assert not found.any()
+    np.testing.assert_array_equal(points, -1)
+
+
+def test_contour_edges_raster_draws_the_added_lines(contour_and_raster):
+    contour, raster = contour_and_raster
+    np.testing.assert_array_equal(np.asarray(contour), raster)
+    contour.add_line(np.array([0, 0]), np.array([0, raster.shape[0] - 1]), 1)
+    assert np.all(contour[:, 0] == 255)
+    points, found = contour.cast_rays(np.array([[raster.shape[0] / 2, 0.5]]), np.array([-np.pi / 2]))
+    assert found[0]
+    assert points[0, 0] <= 1
@@ -0,0 +1,23 @@
+import numpy as np
+
+from src.utils.edge_field import EdgeDistanceField, index_edges
+from src.utils.ray_casting import _traverse
+from tests.references import random_rays
+
+
+def test_edge_field_matches_traverse(edges):
+    origins, angles = random_rays(edges, 2000)
+    # a few rays start outside of the image
+    origins[:20] -= np.max(edges.shape)
+    points, found, _, _ = _traverse(origins, angles, edges, max(edges.shape) + 2)
+    field_points, field_found = EdgeDistanceField(edges).cast_rays(origins, angles)
+    np.testing.assert_array_equal(field_found, found)
+    np.testing.assert_array_equal(field_points, points)
+
+
+def test_edge_field_stands_for_the_edges(edges):
+    field = index_edges(edges)
+    assert isinstance(field, EdgeDistanceField)
+    assert field.shape == edges.shape
+    np.testing.assert_array_equal(np.asarray(field), edges)
+    assert index_edges(field) is field
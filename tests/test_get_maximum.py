@@ -0,0 +1,38 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from src.utils.get_maximum import get_max_approx, get_max_pt
+from tests import references
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_max_approx_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    # integer points so that the norms have ties
+    top, bottom = rng.integers(0, 20, (2, 100, 2))
+    assert get_max_approx(top, bottom) == references.get_max_approx(top, bottom)
+
+
+def test_get_max_approx_needs_the_same_number_of_points():
+    assert get_max_approx(np.zeros((3, 2)), np.zeros((2, 2))) is None
+
+
+@pytest.mark.parametrize("name", references.SILHOUETTES)
+def test_get_max_pt_matches_baseline(name):
+    edges = references.silhouette_edges(name)
+    im = cv.imread(f"{references.PICTURES}/{name}.jpg", cv.IMREAD_GRAYSCALE)
+    rows, cols = np.nonzero(im < 128)
+    rng = np.random.default_rng(0)
+    for i, j in rng.integers(0, len(rows), (10, 2)):
+        start, end = np.array([cols[i], rows[i]]), np.array([cols[j], rows[j]])
+        result, r_side, l_side = references.max_pt_sides(start, end, edges)
+        if len(r_side) != len(result) or len(l_side) != len(result):
+            continue
+        widths = np.linalg.norm(np.array(r_side) - np.array(l_side), axis=1)
+        expected = references.get_max_approx(r_side, l_side)
+        point = get_max_pt(start, end, edges)
+        index = min(range(len(result)), key=lambda k: np.hypot(*np.subtract(result[k][::-1], point)))
+        np.testing.assert_allclose(point, result[index][::-1])
+        # a hit one pixel apart from the old walk can move the maximum to a sample of the same width
+        assert abs(widths[index] - widths[expected]) <= 2
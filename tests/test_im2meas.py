@@ -0,0 +1,151 @@
+import os
+import collections
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import src.im2meas as im2meas
+import src.utils.cache as cache
+import src.utils.checkpoints as checkpoints
+from src.im2meas import YeadonModel, VIEWS
+from src.utils.checkpoints import STAGES
+from src.utils.measurements import MeasurementGraph, YEADON_MEASUREMENTS, ACROBATIC_MARKERS, DRAWN_MEASUREMENTS
+
+LANDMARK_METHODS = {
+    "front": "_front_landmarks",
+    "side": "_side_landmarks",
+    "tuck": "_tuck_landmarks",
+    "r_tuck": "_r_tuck_landmarks",
+    "pike": "_pike_landmarks",
+}
+
+
+def _silhouette(path: str, shift: int = 0):
+    """
+    Write a white ellipse on black (the foreground of a view without its background).
+    """
+    image = np.zeros((900, 600, 3), dtype=np.uint8)
+    cv.ellipse(image, (300 + shift, 460), (150, 350), 0, 0, 360, (255, 255, 255), -1)
+    cv.imwrite(path, image)
+
+
+def _fake_landmarks(names: list):
+    # the landmarks of a view are spread on the silhouette, every measurement of the view can be taken
+    def landmarks(self, *args):
+        rng = np.random.default_rng(len(names))
+        return {name: np.array([300 + rng.uniform(-20, 20), 260 + i * 400 / len(names)]) for i, name in enumerate(names)}
+    return landmarks
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """
+    Run YeadonModel on synthetic views without the segmentation and pose networks, count the calls of its stages.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(checkpoints, "RUN_DIR", str(tmp_path / "runs"))
+    paths = {view: str(tmp_path / f"athlete_{view}.jpg") for view in VIEWS}
+    for shift, path in enumerate(paths.values()):
+        _silhouette(path, shift)
+    calls = collections.Counter()
+
+    def segment(self, state, views, *args):
+        images = {view: cv.imread(view_args["im_path"]) for view, view_args in zip(VIEWS, views)}
+        return {"images": images, "foregrounds": dict(images), "ratios": {view: np.array([1.0, 1.0]) for view in VIEWS}}
+
+    def pose(self, state, cache_keys):
+        return {"keypoints": {view: np.c_[np.full((133, 2), 300.0), np.ones(133)] for view in VIEWS}}
+
+    def counted(stage, method):
+        def wrapper(*args, **kwargs):
+            calls[stage] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(YeadonModel, "_segment", counted("segment", segment))
+    monkeypatch.setattr(YeadonModel, "_pose", counted("pose", pose))
+    for stage in ("scale", "landmarks", "measurements", "outputs"):
+        monkeypatch.setattr(YeadonModel, f"_{stage}", counted(stage, getattr(YeadonModel, f"_{stage}")))
+    needed = MeasurementGraph({}, {}).dependencies([*YEADON_MEASUREMENTS, *ACROBATIC_MARKERS, *DRAWN_MEASUREMENTS])
+    for view, method in LANDMARK_METHODS.items():
+        names = sorted({name for _, primitive_view, *ends in needed if primitive_view == view for name in ends})
+        monkeypatch.setattr(YeadonModel, method, _fake_landmarks(names))
+    monkeypatch.setattr(im2meas, "better_edges", lambda edges, data: edges)
+    monkeypatch.setattr(im2meas, "thresh", counted("thresh", im2meas.thresh))
+    measure = MeasurementGraph._measure
+
+    def measure_view(graph, primitive):
+        # the primitives measured on each view
+        calls[("measure", primitive[1])] += 1
+        return measure(graph, primitive)
+
+    monkeypatch.setattr(MeasurementGraph, "_measure", measure_view)
+
+    def run(mass: float = 0, **kwargs):
+        calls.clear()
+        return YeadonModel(
+            paths["front"], paths["pike"], paths["r_tuck"], paths["side"], paths["tuck"], 0, mass, 0, 350, 0, workers=0, **kwargs
+        )
+
+    run.paths, run.calls = paths, calls
+    return run
+
+
+def test_resume_skips_the_checkpointed_stages(pipeline):
+    model = pipeline()
+    assert [pipeline.calls[stage] for stage in STAGES] == [1] * len(STAGES)
+    assert os.path.exists("athlete.txt")
+    os.remove("athlete.txt")
+
+    resumed = pipeline(resume=True)
+    assert [pipeline.calls[stage] for stage in STAGES] == [0] * (len(STAGES) - 1) + [1]
+    # the outputs of a complete run are written again
+    assert os.path.exists("athlete.txt")
+    assert resumed.keypoints == model.keypoints
+
+
+def test_until_stops_after_its_stage(pipeline):
+    pipeline(until="scale")
+    assert [pipeline.calls[stage] for stage in STAGES] == [1, 1, 1, 0, 0, 0]
+    assert not os.path.exists("athlete.txt")
+
+    pipeline(resume=True)
+    assert [pipeline.calls[stage] for stage in STAGES] == [0, 0, 0, 1, 1, 1]
+    assert os.path.exists("athlete.txt")
+
+
+def test_resume_with_other_parameters_computes_every_stage(pipeline):
+    pipeline(until="landmarks")
+    pipeline(mass=60, resume=True)
+    assert [pipeline.calls[stage] for stage in STAGES] == [1] * len(STAGES)
+
+
+def test_only_the_changed_views_are_measured_again(pipeline):
+    model = pipeline()
+    assert all(pipeline.calls[("measure", view)] for view in VIEWS)
+
+    # the landmarks and the primitives of every view are in the cache
+    cached = pipeline()
+    assert not any(pipeline.calls[("measure", view)] for view in VIEWS)
+    assert pipeline.calls["thresh"] == 0
+    assert cached.keypoints == model.keypoints
+
+    _silhouette(pipeline.paths["tuck"], 10)
+    pipeline()
+    assert [view for view in VIEWS if pipeline.calls[("measure", view)]] == ["tuck"]
+    assert pipeline.calls["thresh"] == 1
+
+    # the landmarks of the side view depend on the key points of the front view
+    _silhouette(pipeline.paths["front"], 10)
+    pipeline()
+    assert [view for view in VIEWS if pipeline.calls[("measure", view)]] == ["front", "side"]
+
+
+def test_the_same_photo_is_measured_for_each_view(pipeline):
+    for path in pipeline.paths.values():
+        _silhouette(path)
+    pipeline()
+    assert all(pipeline.calls[("measure", view)] for view in VIEWS)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import src.utils.get_maximum as get_maximum
+import src.utils.ray_casting as ray_casting
+from src.utils.ray_casting import cast_rays
+from tests import references
+from tests.references import random_rays
+
+
+@pytest.fixture
+def numpy_rays(monkeypatch):
+    # traverse the edges with NumPy even when Numba is installed
+    monkeypatch.setattr(ray_casting, "kernel_edges", lambda edges: None)
+
+
+def test_cast_rays_matches_find_edge(edges, numpy_rays):
+    origins, angles = random_rays(edges, 100)
+    points, found = cast_rays(origins, angles, edges)
+    for origin, angle, point, hit in zip(origins, angles, points, found):
+        reference = references.find_edge(origin, angle, edges)
+        assert hit == bool(reference)
+        if hit:
+            # the 0.01 steps of the old walk can jump over the corner of a pixel the exact traversal visits
+            assert np.max(np.abs(point - np.array(reference[0]))) <= 1
+        else:
+            assert tuple(point) == (-1, -1)
+
+
+def test_find_edge_appends_only_the_hits(edges, numpy_rays):
+    origins, angles = random_rays(edges, 50, seed=4)
+    for origin, angle in zip(origins, angles):
+        save = get_maximum.find_edge(origin, angle, edges, save=[(0, 0)])
+        reference = references.find_edge(origin, angle, edges)
+        assert len(save) == 1 + len(reference)
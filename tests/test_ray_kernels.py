@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import src.utils.get_maximum as get_maximum
+import src.utils.ray_casting as ray_casting
+from src.utils.ray_casting import _traverse
+from src.utils.ray_kernels import NUMBA_AVAILABLE, kernel_edges, cast_rays_kernel
+from tests import references
+from tests.references import random_rays
+
+needs_numba = pytest.mark.skipif(not NUMBA_AVAILABLE, reason="Numba is not installed")
+
+
+@needs_numba
+def test_cast_rays_kernel_matches_numpy(edges):
+    origins, angles = random_rays(edges, 1000)
+    points, found, _, _ = _traverse(origins, angles, edges, max(edges.shape) + 2)
+    kernel_points, kernel_found = cast_rays_kernel(origins, angles, kernel_edges(edges))
+    np.testing.assert_array_equal(kernel_found, found)
+    np.testing.assert_array_equal(kernel_points, points)
+
+
+@needs_numba
+def test_cast_rays_kernel_matches_find_edge(edges):
+    origins, angles = random_rays(edges, 100)
+    kernel_points, kernel_found = cast_rays_kernel(origins, angles, kernel_edges(edges))
+    for origin, angle, point, found in zip(origins, angles, kernel_points, kernel_found):
+        reference = references.find_edge(origin, angle, edges)
+        assert found == bool(reference)
+        if found:
+            # the 0.01 steps of the old walk can jump over the corner of a pixel the exact traversal visits
+            assert np.max(np.abs(point - np.array(reference[0]))) <= 1
+
+
+@needs_numba
+def test_sweep_kernel_matches_numpy(edges, monkeypatch):
+    rng = np.random.default_rng(1)
+    height, width = edges.shape[:2]
+    for start in np.column_stack((rng.integers(0, width, 5), rng.integers(0, height, 5))):
+        kernel_result = get_maximum.get_maximum_pit(start, edges)
+        with monkeypatch.context() as patch:
+            patch.setattr(get_maximum, "kernel_edges", lambda edges: None)
+            patch.setattr(ray_casting, "kernel_edges", lambda edges: None)
+            numpy_result = get_maximum.get_maximum_pit(start, edges)
+        assert kernel_result == numpy_result
+
+
+@needs_numba
+def test_sweep_kernel_matches_get_maximum_pit(edges):
+    rng = np.random.default_rng(2)
+    height, width = edges.shape[:2]
+    for start in np.column_stack((rng.integers(0, width, 3), rng.integers(0, height, 3))):
+        assert get_maximum.get_maximum_pit(start, edges) == references.get_maximum_pit(start, edges)
+
+
+def test_polar_profile_matches_get_maximum_pit(edges, monkeypatch):
+    monkeypatch.setattr(get_maximum, "kernel_edges", lambda edges: None)
+    monkeypatch.setattr(ray_casting, "kernel_edges", lambda edges: None)
+    rng = np.random.default_rng(3)
+    height, width = edges.shape[:2]
+    for start in np.column_stack((rng.integers(0, width, 3), rng.integers(0, height, 3))):
+        assert get_maximum.get_maximum_pit(start, edges) == references.get_maximum_pit(start, edges)